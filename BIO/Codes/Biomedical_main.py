@@ -4,13 +4,13 @@ import numpy as np
 import board
 import busio
 import adafruit_mlx90614
-import requests
 from ads1115_driver import ADS1115Reader
 from max30102_driver import MAX30102
 from ecg_processing import bandpass_filter, detect_r_peaks, calculate_heart_rate
 from respiration_calc import estimate_respiration
 from spo2_calc import calculate_spo2
 from ptt_processor import calculate_ptt, estimate_bp
+from uplink import Uplink
 
 # ================= SETTINGS =================
 fs_ecg = 250
@@ -37,7 +37,8 @@ config = load_config()
 plate = config.get("plate", "UNKNOWN")
 model_name = config.get("model", "UNKNOWN")
 server_ip = config.get("server_ip", "192.168.100.14")
-server_url = f"http://{server_ip}:5000/trigger"
+# Spools to disk while the server is unreachable and replays once it is back
+uplink = Uplink(server_ip, spool_path="bio-spool.db")
 
 # ================= MLX90614 SETUP =================
 i2c = busio.I2C(board.SCL, board.SDA)
@@ -146,11 +147,8 @@ def send_to_server(hr, spo2, rr, temp, sys_bp, dia_bp, bac, hand_removed=False):
         "bio": bio_data
     }
 
-    try:
-        res = requests.post(server_url, json=payload, timeout=3)
-        print(f"✅ Sent | Hand Removed: {hand_removed}")
-    except Exception as e:
-        print(f"❌ Failed to send data: {e}")
+    uplink.send(payload)
+    print(f"📤 Queued | Hand Removed: {hand_removed}")
 
 # ================= MAIN =================
 def main():
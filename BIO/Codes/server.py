@@ -1,12 +1,19 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, abort
 from flask_cors import CORS
 from datetime import datetime
 
+from blob_store import BlobStore, guess_mimetype
+
 app = Flask(__name__)
 CORS(app)
 
 fleet_data = {}
 
+# Decoded images, one file per sha256 digest; latest/history only keep the hash.
+# The same store as setup code/server.py (blob_store.py from the shared
+# deployment folder)
+images = BlobStore()
+
 @app.route('/trigger', methods=['POST'])
 def trigger():
     data = request.get_json()
@@ -22,7 +29,7 @@ def trigger():
             "history": [],
             "latest": {
                 "cv_label": "No detection",
-                "cv_image": "",
+                "cv_image_id": "",
                 "vd_label": "normal",
                 "bio": {
                     "heart_rate": 0,
@@ -39,7 +46,10 @@ def trigger():
     if "cv_label" in data:
         fleet_data[plate]["latest"]["cv_label"] = data["cv_label"]
     if "cv_image" in data:
-        fleet_data[plate]["latest"]["cv_image"] = data["cv_image"]
+        try:
+            fleet_data[plate]["latest"]["cv_image_id"] = images.put_base64(data["cv_image"])
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid image"}), 400
     if "vd_label" in data:
         fleet_data[plate]["latest"]["vd_label"] = data["vd_label"]
     if "bio" in data:
@@ -49,7 +59,7 @@ def trigger():
     entry = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "cv_label": fleet_data[plate]["latest"]["cv_label"],
-        "cv_image": fleet_data[plate]["latest"]["cv_image"],
+        "cv_image_id": fleet_data[plate]["latest"]["cv_image_id"],
         "vd_label": fleet_data[plate]["latest"]["vd_label"],
         "bio": fleet_data[plate]["latest"]["bio"]
     }
@@ -71,5 +81,18 @@ def get_history(plate):
     else:
         return jsonify({"message": "No history available"}), 404
 
+@app.route('/image/<digest>', methods=['GET'])
+def get_image(digest):
+    if not images.exists(digest):
+        abort(404)
+    path = images.path(digest)
+    with open(path, "rb") as f:
+        mimetype = guess_mimetype(f.read(12))
+    response = send_file(path, mimetype=mimetype, etag=digest,
+                         conditional=True, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
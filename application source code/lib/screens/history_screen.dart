@@ -29,7 +29,7 @@ class _HistoryScreenState extends State<HistoryScreen> {
 
   Future<void> fetchHistory() async {
     if (serverIP == null) return;
-    final response = await http.get(Uri.parse('http://$serverIP:5000/history/${widget.plate}'));
+    final response = await http.get(Uri.parse('http://$serverIP:5000/history/${widget.plate}?view=snapshot'));
     if (response.statusCode == 200) {
       setState(() {
         history = jsonDecode(response.body);
@@ -43,10 +43,12 @@ class _HistoryScreenState extends State<HistoryScreen> {
     final speed = entry['speed'] ?? {};
     final actualSpeed = speed['actual'] ?? 0.0;
     final targetSpeed = speed['target'] ?? 0.0;
-    final base64Image = entry['cv_image'];
-    final hasImage = base64Image != null && base64Image.isNotEmpty;
+    // Snapshots carry the full vehicle state, show the camera that sent this entry
+    final camera = (entry['source'] == 'exterior' ? entry['exterior'] : entry['interior']) ?? {};
+    final imageId = camera['cv_image_id'] ?? camera['exterior_image_id'];
+    final hasImage = imageId != null && imageId.isNotEmpty;
 
-    final cvLabel = entry['cv_label'] ?? 'N/A';
+    final cvLabel = camera['cv_label'] ?? 'N/A';
     final vdLabel = entry['vd_label'] ?? 'N/A';
     final bio = entry['bio'] ?? {};
     final bp = bio['blood_pressure'] ?? {};
@@ -68,8 +70,8 @@ class _HistoryScreenState extends State<HistoryScreen> {
           if (hasImage)
             Container(
               margin: EdgeInsets.symmetric(vertical: 8),
-              child: Image.memory(
-                base64Decode(base64Image),
+              child: Image.network(
+                'http://$serverIP:5000/image/$imageId',
                 height: 200,
                 fit: BoxFit.contain,
               ),
@@ -17,12 +17,23 @@ class HomeScreen extends StatefulWidget {
 }
 
 class _HomeScreenState extends State<HomeScreen> {
+  // Recent events kept per list; older ones are still on the history screen
+  static const int maxRecentEvents = 200;
+
   Map<String, dynamic> vehicleData = {};
   String serverStatus = '';
   Timer? _timer;
+  http.Client? _streamClient;
+  String? _latestEtag;
+  // Server boot id from the ETag ("<boot>-<version>"); a new one means it restarted
+  String? _bootId;
   String? serverIP;
   List<dynamic> interiorEvents = [];
   List<dynamic> exteriorEvents = [];
+  // X-Next-Cursor of the last /history read; later reads only fetch newer entries
+  String? _historyCursor;
+  bool _fetchingHistory = false;
+  bool _historyStale = false;
 
   // Notification tracking flags
   bool _notifiedIllegalAction = false;
@@ -44,7 +55,14 @@ class _HomeScreenState extends State<HomeScreen> {
     serverIP = prefs.getString('server_ip') ?? '192.168.43.1';
     fetchData();
     fetchHistory();
-    _timer = Timer.periodic(const Duration(seconds: 10), (timer) {
+    listenToStream();
+    // Live updates arrive on the stream; polling is only a slow safety net
+    startPolling(const Duration(seconds: 60));
+  }
+
+  void startPolling(Duration interval) {
+    _timer?.cancel();
+    _timer = Timer.periodic(interval, (timer) {
       fetchData();
       fetchHistory();
     });
@@ -53,9 +71,58 @@ class _HomeScreenState extends State<HomeScreen> {
   @override
   void dispose() {
     _timer?.cancel();
+    _streamClient?.close();
+    _streamClient = null;
     super.dispose();
   }
 
+  Future<void> listenToStream() async {
+    if (serverIP == null) return;
+    final client = http.Client();
+    _streamClient = client;
+    final url = 'http://$serverIP:5000/stream/${widget.vehicle.plate}';
+    try {
+      final response = await client.send(http.Request('GET', Uri.parse(url)));
+      if (response.statusCode == 503 || response.statusCode == 404) {
+        // No stream here (e.g. a waitress server, or no data for the plate
+        // yet): don't retry it, poll instead
+        client.close();
+        if (mounted && _streamClient == client) {
+          _streamClient = null;
+          startPolling(const Duration(seconds: 10));
+        }
+        return;
+      }
+      if (response.statusCode == 200) {
+        final lines = response.stream.transform(utf8.decoder).transform(const LineSplitter());
+        await for (final line in lines) {
+          if (!line.startsWith('data: ') || !mounted) continue;
+          final changes = jsonDecode(line.substring(6)) as Map<String, dynamic>;
+          final data = {...vehicleData, ...changes};
+          setState(() {
+            vehicleData = data;
+            serverStatus = '';
+          });
+          checkForCriticalEvents(data);
+          if (changes.containsKey('interior') || changes.containsKey('exterior')) {
+            fetchHistory();
+          }
+        }
+      }
+    } catch (_) {}
+
+    // Stream closed or failed: reconnect after a short pause unless disposed
+    if (!mounted || _streamClient != client) return;
+    client.close();
+    await Future.delayed(const Duration(seconds: 5));
+    if (mounted && _streamClient == client) {
+      // fetchData() notices a restart and reloads the history then
+      fetchData();
+      fetchHistory();
+      listenToStream();
+    }
+  }
+
   void addNotification(String title, String body) {
     final notificationText = "$title: $body";
     if (!notifications.contains(notificationText)) {
@@ -70,8 +137,20 @@ class _HomeScreenState extends State<HomeScreen> {
     if (serverIP == null) return;
     final url = 'http://$serverIP:5000/data/${widget.vehicle.plate}';
     try {
-      final response = await http.get(Uri.parse(url));
+      final response = await http.get(
+        Uri.parse(url),
+        headers: {if (_latestEtag != null) 'If-None-Match': _latestEtag!},
+      );
+      if (response.statusCode == 304) return;
       if (response.statusCode == 200) {
+        _latestEtag = response.headers['etag'];
+        final bootId = _latestEtag?.replaceAll('"', '').split('-').first;
+        if (_bootId != null && bootId != _bootId) {
+          // Restarted: cursors from the previous run mean nothing now
+          _historyCursor = null;
+          fetchHistory();
+        }
+        _bootId = bootId;
         final data = jsonDecode(response.body);
         setState(() {
           vehicleData = data;
@@ -92,19 +171,40 @@ class _HomeScreenState extends State<HomeScreen> {
     }
   }
 
+  List<dynamic> _recent(List<dynamic> events) =>
+      events.length > maxRecentEvents ? events.sublist(events.length - maxRecentEvents) : events;
+
   Future<void> fetchHistory() async {
     if (serverIP == null) return;
-    final url = 'http://$serverIP:5000/history/${widget.vehicle.plate}';
+    // One read at a time, so two reads never append the same entries
+    if (_fetchingHistory) {
+      _historyStale = true;
+      return;
+    }
+    _fetchingHistory = true;
+    final cursor = _historyCursor;
+    final url = 'http://$serverIP:5000/history/${widget.vehicle.plate}'
+        '${cursor != null ? '?cursor=$cursor' : ''}';
     try {
       final response = await http.get(Uri.parse(url));
-      if (response.statusCode == 200) {
-        final data = jsonDecode(response.body);
+      if (_historyCursor != cursor) {
+        _historyStale = true; // reset while this read was in flight
+      } else if (response.statusCode == 200 && mounted) {
+        final List<dynamic> data = jsonDecode(response.body);
+        final interior = data.where((e) => e['source'] == 'interior').toList();
+        final exterior = data.where((e) => e['source'] == 'exterior').toList();
         setState(() {
-          interiorEvents = data.where((e) => e['source'] == 'interior').toList();
-          exteriorEvents = data.where((e) => e['source'] == 'exterior').toList();
+          interiorEvents = _recent(cursor == null ? interior : [...interiorEvents, ...interior]);
+          exteriorEvents = _recent(cursor == null ? exterior : [...exteriorEvents, ...exterior]);
         });
+        _historyCursor = response.headers['x-next-cursor'] ?? _historyCursor;
       }
     } catch (_) {}
+    _fetchingHistory = false;
+    if (_historyStale && mounted) {
+      _historyStale = false;
+      fetchHistory();
+    }
   }
 
   void checkForCriticalEvents(Map<String, dynamic> data) {
@@ -197,12 +297,15 @@ class _HomeScreenState extends State<HomeScreen> {
     }
   }
 
+  // Images are served once by content hash and cached by the HTTP client
+  String imageUrl(String imageId) => 'http://$serverIP:5000/image/$imageId';
+
   Widget buildLiveInteriorSection() {
     final interior = vehicleData['interior'] ?? {};
     final label = interior['cv_label'] ?? 'No actions detected';
-    final base64Image = interior['cv_image'];
+    final imageId = interior['cv_image_id'];
 
-    if (label == 'No detection' && (base64Image == null || base64Image.isEmpty)) return SizedBox.shrink();
+    if (label == 'No detection' && (imageId == null || imageId.isEmpty)) return SizedBox.shrink();
 
     return Card(
       elevation: 3,
@@ -214,9 +317,9 @@ class _HomeScreenState extends State<HomeScreen> {
           crossAxisAlignment: CrossAxisAlignment.start,
           children: [
             Text('🧠 Interior Behavior (Live)', style: TextStyle(fontSize: 18, fontWeight: FontWeight.bold)),
-            if (base64Image != null && base64Image.isNotEmpty) ...[
+            if (imageId != null && imageId.isNotEmpty) ...[
               SizedBox(height: 8),
-              Image.memory(base64Decode(base64Image), height: 180, fit: BoxFit.cover),
+              Image.network(imageUrl(imageId), height: 180, fit: BoxFit.cover),
             ],
             SizedBox(height: 6),
             Text('Detected Action: $label'),
@@ -230,9 +333,9 @@ class _HomeScreenState extends State<HomeScreen> {
     final exterior = vehicleData['exterior'] ?? {};
     final warning = exterior['collision_warning'] ?? '';
     final laneAlert = exterior['lane_alert'] ?? '';
-    final base64Image = exterior['exterior_image'];
+    final imageId = exterior['exterior_image_id'];
 
-    if ((base64Image == null || base64Image.isEmpty) && warning.isEmpty && laneAlert.isEmpty) return SizedBox.shrink();
+    if ((imageId == null || imageId.isEmpty) && warning.isEmpty && laneAlert.isEmpty) return SizedBox.shrink();
 
     return Card(
       elevation: 3,
@@ -244,9 +347,9 @@ class _HomeScreenState extends State<HomeScreen> {
           crossAxisAlignment: CrossAxisAlignment.start,
           children: [
             Text('🌐 Exterior Behavior (Live)', style: TextStyle(fontSize: 18, fontWeight: FontWeight.bold)),
-            if (base64Image != null && base64Image.isNotEmpty) ...[
+            if (imageId != null && imageId.isNotEmpty) ...[
               SizedBox(height: 8),
-              Image.memory(base64Decode(base64Image), height: 180, fit: BoxFit.cover),
+              Image.network(imageUrl(imageId), height: 180, fit: BoxFit.cover),
             ],
             if (warning.isNotEmpty)
               Text("🚨 $warning", style: TextStyle(color: Colors.red, fontWeight: FontWeight.bold)),
@@ -273,11 +376,11 @@ class _HomeScreenState extends State<HomeScreen> {
         children: events.map<Widget>((e) {
           final ts = e['timestamp'] ?? '';
           final label = e['cv_label'] ?? e['vd_label'] ?? 'Event';
-          final img = e['cv_image'] ?? e['exterior_image'];
+          final img = e['cv_image_id'] ?? e['exterior_image_id'];
           final hasImage = img != null && img.isNotEmpty;
           return ListTile(
             leading: hasImage
-                ? Image.memory(base64Decode(img), width: 56, fit: BoxFit.cover)
+                ? Image.network(imageUrl(img), width: 56, fit: BoxFit.cover)
                 : Icon(Icons.event_note),
             title: Text(label),
             subtitle: Text(ts),
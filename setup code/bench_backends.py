@@ -0,0 +1,86 @@
+# Speed and accuracy of each CPU inference backend (detector_backend.py)
+# for one YOLO model.
+#
+# For every backend/precision it loads (exporting on first use) the same
+# weights, runs them over a folder of frames the way inner.py and outer.py
+# do (640x480, one frame at a time), and with --data also validates them
+# on a labelled dataset. Prints FPS, latency, boxes per frame and mAP side
+# by side, so a speed-up can be weighed against what it costs in accuracy.
+# Usage: python bench_backends.py --weights best.pt --images frames/ --data cabin.yaml \
+#            --calibration frames/ --backends pytorch onnx openvino onnx-int8 openvino-int8
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+from util import percentile
+from detector_backend import IMAGE_EXTENSIONS, IMAGE_SIZE, load_detector
+
+
+def load_frames(folder, limit):
+    files = sorted(path for path in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+                   if path.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    frames = [cv2.resize(image, (640, 480)) for image in map(cv2.imread, files) if image is not None]
+    if not frames:
+        raise SystemExit(f"No images found in {folder}")
+    return frames
+
+
+def bench_speed(model, frames, count, warmup):
+    for i in range(warmup):
+        model(frames[i % len(frames)], verbose=False)
+    latencies = []
+    boxes = 0
+    started = time.perf_counter()
+    for i in range(count):
+        start = time.perf_counter()
+        results = model(frames[i % len(frames)], verbose=False)
+        latencies.append(time.perf_counter() - start)
+        boxes += sum(len(r.boxes) for r in results if r.boxes is not None)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return count / elapsed, latencies, boxes / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", required=True, help="the .pt model, e.g. best.pt or traffic_sign_detector.pt")
+    parser.add_argument("--images", required=True, help="folder of frames to time inference on")
+    parser.add_argument("--data", help="labelled dataset .yaml for mAP, skipped if not given")
+    parser.add_argument("--calibration", help="folder of images or dataset .yaml for the INT8 variants")
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "onnx", "openvino"],
+                        help="backend names, with -int8 for the quantized variant")
+    parser.add_argument("--frames", type=int, default=200, help="timed inferences per backend")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--imgsz", type=int, default=IMAGE_SIZE)
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.frames)
+    rows = []
+    for name in args.backends:
+        backend, _, precision = name.partition("-")
+        int8 = precision == "int8"
+        print(f"⏱️ {name}")
+        model = load_detector(args.weights, backend, int8=int8, calibration=args.calibration or args.data,
+                              imgsz=args.imgsz)
+        fps, latencies, boxes = bench_speed(model, frames, args.frames, args.warmup)
+        map50 = map50_95 = None
+        if args.data:
+            metrics = model.val(data=args.data, imgsz=args.imgsz, batch=1, plots=False, verbose=False)
+            map50, map50_95 = metrics.box.map50, metrics.box.map
+        rows.append((name, fps, percentile(latencies, 50), percentile(latencies, 95), boxes, map50, map50_95))
+
+    baseline = rows[0][1]
+    print(f"\n📊 {os.path.basename(args.weights)} on {len(frames)} frames, {args.frames} inferences each")
+    print(f"{'backend':<16}{'FPS':>8}{'speed-up':>10}{'p50 ms':>9}{'p95 ms':>9}{'boxes':>7}{'mAP50':>8}{'mAP50-95':>10}")
+    for name, fps, p50, p95, boxes, map50, map50_95 in rows:
+        accuracy = f"{map50:>8.3f}{map50_95:>10.3f}" if map50 is not None else f"{'-':>8}{'-':>10}"
+        print(f"{name:<16}{fps:>8.1f}{fps / baseline:>9.2f}x{p50 * 1000:>9.1f}{p95 * 1000:>9.1f}{boxes:>7.2f}{accuracy}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
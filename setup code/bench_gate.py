@@ -0,0 +1,110 @@
+# CPU saving and detection recall of motion-gated, adaptive-rate inference
+# (motion_gate.py) on recorded cabin clips.
+#
+# Every frame of every clip is inferred once, which is the baseline
+# inner.py used to run. The gate and rate controller are then replayed on
+# the clip's own timeline (frame index / clip FPS) with the inference cost
+# measured for that frame, reusing the baseline result for the frames they
+# let through. A baseline detection counts as recalled if the gated run
+# saw the same label within --window seconds of it.
+# Usage: python bench_gate.py --weights best.pt --clips cabin1.mp4 cabin2.mp4 --cpu-budget 0.5 --min-rate 1
+import argparse
+import sys
+import time
+from bisect import bisect_left
+
+import cv2
+
+from detector_backend import BACKENDS, load_detector
+from motion_gate import MotionGate, RateController, MOTION_THRESHOLD
+
+
+def replay(model, path, args):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    gate = MotionGate(args.threshold)
+    controller = RateController(args.cpu_budget, args.min_rate, args.max_rate, args.latency_budget)
+    baseline = {}  # label -> frame times it was detected at
+    gated = {}
+    cost = {"baseline": 0.0, "gated": 0.0, "gate": 0.0}
+    frames = inferred = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        now = frames / fps
+        frames += 1
+
+        start = time.process_time()
+        results = model(cv2.resize(frame, (640, 480)), verbose=False)
+        seconds = time.process_time() - start
+        cost["baseline"] += seconds
+        labels = {model.names[int(c)] for r in results if r.boxes is not None for c in r.boxes.cls}
+        for label in labels:
+            baseline.setdefault(label, []).append(now)
+
+        start = time.process_time()
+        moved = gate.moved(frame)
+        cost["gate"] += time.process_time() - start
+        if controller.due(now, moved):
+            gate.mark()
+            inferred += 1
+            cost["gated"] += seconds
+            controller.observe(now, seconds, latency=seconds)
+            for label in labels:
+                gated.setdefault(label, []).append(now)
+    cap.release()
+    return frames, frames / fps, inferred, baseline, gated, cost
+
+
+def recalled(times, found, window):
+    hits = 0
+    for t in times:
+        i = bisect_left(found, t - window)
+        hits += i < len(found) and found[i] <= t + window
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", required=True)
+    parser.add_argument("--clips", nargs="+", required=True, help="recorded cabin videos")
+    parser.add_argument("--backend", choices=BACKENDS, default="pytorch")
+    parser.add_argument("--cpu-budget", type=float, default=0.5, help="share of one core inference may use")
+    parser.add_argument("--min-rate", type=float, default=1, help="inferences per second even when nothing moves")
+    parser.add_argument("--max-rate", type=float, default=15)
+    parser.add_argument("--latency-budget", type=float, help="seconds, optional")
+    parser.add_argument("--threshold", type=float, default=MOTION_THRESHOLD, help="fraction of pixels that moved")
+    parser.add_argument("--window", type=float, default=2, help="seconds a gated detection may be off by")
+    args = parser.parse_args()
+
+    model = load_detector(args.weights, args.backend)
+    totals = {"frames": 0, "seconds": 0.0, "inferred": 0, "baseline": 0.0, "gated": 0.0, "gate": 0.0}
+    hits, misses = {}, {}
+    for path in args.clips:
+        frames, seconds, inferred, baseline, gated, cost = replay(model, path, args)
+        print(f"🎞️ {path}: {frames} frames over {seconds:.0f}s, {inferred} inferred"
+              f" ({inferred / max(frames, 1):.0%})")
+        totals["frames"] += frames
+        totals["seconds"] += seconds
+        totals["inferred"] += inferred
+        for key in cost:
+            totals[key] += cost[key]
+        for label, times in baseline.items():
+            found = recalled(times, gated.get(label, []), args.window)
+            hits[label] = hits.get(label, 0) + found
+            misses[label] = misses.get(label, 0) + len(times) - found
+
+    gated_cpu = totals["gated"] + totals["gate"]
+    print(f"\n📊 {totals['frames']} frames, {totals['seconds']:.0f}s of video")
+    print(f"🧮 Inference CPU: every frame {totals['baseline']:.1f}s, gated {gated_cpu:.1f}s"
+          f" (gate itself {totals['gate']:.2f}s) -> {1 - gated_cpu / max(totals['baseline'], 1e-9):.0%} saved,"
+          f" {totals['inferred'] / max(totals['seconds'], 1e-9):.1f} inferences/s")
+    for label in sorted(hits):
+        total = hits[label] + misses[label]
+        print(f"🎯 {label:<12} recall {hits[label] / total:6.1%} ({hits[label]}/{total} detections)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
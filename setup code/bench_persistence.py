@@ -0,0 +1,64 @@
+# Ingest throughput and restart time of the persistence layer with a
+# simulated fleet. Usage: python bench_persistence.py --vehicles 120 --events 500
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from history_store import HISTORY_MAX_ENTRIES
+from persistence import Persistence
+
+
+def fake_entry(plate, i):
+    # Same shapes the edge scripts post, with images already replaced by hashes
+    now = time.time()
+    kind = i % 4
+    if kind == 0:
+        data = {"actual_speed": round(random.uniform(0, 120), 2), "vd_label": random.choice(["normal", "aggressive"])}
+    elif kind == 1:
+        data = {"source": "interior", "cv_label": "sleep", "cv_image_id": "%064x" % random.getrandbits(256)}
+    elif kind == 2:
+        data = {"bio": {"heart_rate": random.randint(55, 110), "oxygen": 97, "respiration_rate": 16,
+                        "temperature": 36.8, "alcohol": 0.0,
+                        "blood_pressure": {"systolic": 120, "diastolic": 80}}}
+    else:
+        data = {"actual_speed": 60.0, "target_speed": 80.0}
+    return {"timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "received_at": now,
+            "source": data.pop("source", ""), "plate": plate, "model": "Toyota Corolla", **data}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vehicles", type=int, default=120)
+    parser.add_argument("--events", type=int, default=500, help="events per vehicle")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "fleet.db")
+        plates = [f"SIM{n:04d}" for n in range(args.vehicles)]
+        total = args.vehicles * args.events
+
+        store = Persistence(path)
+        store.load(HISTORY_MAX_ENTRIES)
+        store.start()
+        start = time.perf_counter()
+        for i in range(args.events):
+            for plate in plates:
+                store.record(plate, "Toyota Corolla", i, time.time(), fake_entry(plate, i))
+        store.flush()
+        ingest = time.perf_counter() - start
+        store.close()
+        print(f"📥 Ingest: {total} events from {args.vehicles} vehicles in {ingest:.2f}s "
+              f"({total / ingest:.0f} events/s)")
+        print(f"💾 Database size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        fleet = Persistence(path).load(HISTORY_MAX_ENTRIES)
+        restart = time.perf_counter() - start
+        entries = sum(len(vehicle["entries"]) for vehicle in fleet.values())
+        print(f"🔁 Restart: {len(fleet)} vehicles, {entries} history entries restored in {restart:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Sustained /trigger throughput and tail latency for each server mode.
+# Starts server.py on a free local port with a throwaway database for every
+# mode, hammers it from several client processes, then prints the results.
+# --baseline REV also runs server.py as it was at git revision REV (e.g. the
+# commit before lock striping) on Flask's threaded dev server, the way it
+# ran then, so the modes can be compared against it.
+# Usage: python bench_server.py --modes dev gevent waitress --seconds 10
+#        python bench_server.py --baseline <rev> --modes gevent
+import argparse
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from util import free_port, percentile, wait_until_up, HERE
+
+# Serves a checked-out server.py's app the way the old __main__ did
+BASELINE_LAUNCHER = "import sys, server; server.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"
+
+
+def client(port, worker, vehicles, seconds):
+    # One keep-alive connection per client, each posting for its own plates
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    latencies = []
+    errors = 0
+    i = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        plate = f"SIM{worker:02d}{i % vehicles:04d}"
+        body = json.dumps({"plate": plate, "model": "Toyota Corolla",
+                           "actual_speed": 50.0 + i % 30, "vd_label": "normal"})
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/trigger", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    return latencies, errors
+
+
+def checkout(revision, folder):
+    """Extract this folder's files as of revision into folder."""
+    prefix = subprocess.check_output(["git", "rev-parse", "--show-prefix"], cwd=HERE, text=True).strip()
+    top = subprocess.check_output(["git", "rev-parse", "--show-toplevel"], cwd=HERE, text=True).strip()
+    archive = subprocess.check_output(["git", "archive", "--format=tar", f"{revision}:{prefix}"], cwd=top)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(folder)
+
+
+def bench_mode(mode, clients, vehicles, seconds, baseline=None):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, FLEET_DB=os.path.join(folder, "fleet.db"), IMAGE_DIR=os.path.join(folder, "images"))
+        if baseline:
+            source = os.path.join(folder, "baseline")
+            checkout(baseline, source)
+            command = [sys.executable, "-c", BASELINE_LAUNCHER, str(port)]
+            env["PYTHONPATH"] = source
+        else:
+            command = [sys.executable, os.path.join(HERE, "server.py"), "--mode", mode,
+                       "--host", "127.0.0.1", "--port", str(port)]
+        server = subprocess.Popen(command, cwd=folder, env=env, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port)
+            with ProcessPoolExecutor(clients) as pool:
+                results = list(pool.map(client, [port] * clients, range(clients),
+                                        [vehicles] * clients, [seconds] * clients))
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(latency for worker_latencies, _ in results for latency in worker_latencies)
+    errors = sum(worker_errors for _, worker_errors in results)
+    print(f"{mode:>9} | {len(latencies) / seconds:8.0f} req/s | "
+          f"p50 {percentile(latencies, 50) * 1000:6.1f} ms | p95 {percentile(latencies, 95) * 1000:6.1f} ms | "
+          f"p99 {percentile(latencies, 99) * 1000:6.1f} ms | max {latencies[-1] * 1000 if latencies else 0:7.1f} ms | "
+          f"errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=["dev", "gevent", "waitress"])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--vehicles", type=int, default=25, help="plates per client")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--baseline", help="git revision whose server.py to benchmark first")
+    args = parser.parse_args()
+
+    print(f"🚦 {args.clients} clients x {args.vehicles} vehicles, {args.seconds:.0f}s per mode")
+    if args.baseline:
+        bench_mode("baseline", args.clients, args.vehicles, args.seconds, baseline=args.baseline)
+    for mode in args.modes:
+        bench_mode(mode, args.clients, args.vehicles, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Store-and-forward recovery and alert latency of uplink.py against a
+# stand-in server.
+#
+# A minimal /trigger + /trigger/batch receiver runs in this process and is
+# taken down and brought back on the same port on a schedule, while one
+# Uplink with a disk spool produces bulk events at a fixed rate and,
+# optionally, critical alerts. --link-kbps makes the stand-in take as long
+# as a slow cellular link would to receive each request. Prints what was
+# lost, duplicated or evicted, how long each recovery took, the replay
+# throughput, bulk throughput, and end-to-end alert latency on its own.
+# Usage: python bench_uplink.py --rate 20 --up 5 --down 20 --cycles 2
+#        python bench_uplink.py --cycles 0 --seconds 20 --bulk-kb 40 --link-kbps 2000 --alert-rate 0.5
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from util import free_port, percentile
+from uplink import Uplink, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_CRITICAL
+
+
+class StandIn:
+    """Records every event it receives; down() makes the port refuse
+    connections and drops the keep-alive ones already open."""
+
+    def __init__(self, port, link_kbps=0):
+        self.port = port
+        self.link_kbps = link_kbps
+        self.is_up = False
+        self.lock = threading.Lock()
+        self.received = []  # (receive time, event)
+        self._server = None
+
+    def up(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not standin.is_up:
+                    self.close_connection = True
+                    return
+                if standin.link_kbps:
+                    time.sleep(len(body) * 8 / 1000 / standin.link_kbps)
+                data = json.loads(body)
+                events = data if isinstance(data, list) else [data]
+                now = time.time()
+                with standin.lock:
+                    standin.received.extend((now, event) for event in events)
+                reply = {"status": "success", "results": [{"status": "success"} for _ in events]}
+                payload = json.dumps(reply).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        ThreadingHTTPServer.allow_reuse_address = True
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        self.is_up = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def down(self):
+        self.is_up = False
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def produce(uplink, rate, stop, counter, pad=""):
+    interval = 1 / rate
+    next_send = time.monotonic()
+    while not stop.is_set():
+        n = counter[0]
+        counter[0] += 1
+        # Alternate telemetry and detections, so eviction has something to choose
+        priority = PRIORITY_LOW if n % 2 else PRIORITY_NORMAL
+        uplink.send({"plate": "BENCH", "n": n, "actual_speed": n % 120, "pad": pad}, priority=priority)
+        next_send += interval
+        time.sleep(max(0.0, next_send - time.monotonic()))
+
+
+def produce_alerts(uplink, rate, stop, counter, priority):
+    while not stop.wait(1 / rate):
+        uplink.send({"plate": "BENCH", "alert": counter[0], "cv_label": "sleep", "source": "interior"},
+                    priority=priority)
+        counter[0] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=20, help="events per second produced")
+    parser.add_argument("--up", type=float, default=5, help="seconds the server stays up")
+    parser.add_argument("--down", type=float, default=20, help="seconds of each outage")
+    parser.add_argument("--cycles", type=int, default=2)
+    parser.add_argument("--replay-rate", type=float, default=50, help="spooled events per second on recovery")
+    parser.add_argument("--spool-mb", type=float, default=64, help="spool budget, to exercise eviction")
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    parser.add_argument("--seconds", type=float, default=0, help="steady traffic before the outages")
+    parser.add_argument("--bulk-kb", type=float, default=0, help="padding per bulk event, e.g. an image")
+    parser.add_argument("--alert-rate", type=float, default=0, help="critical alerts per second")
+    parser.add_argument("--alerts-as-bulk", action="store_true", help="send alerts on the bulk lane, to compare")
+    parser.add_argument("--link-kbps", type=float, default=0, help="emulated uplink bandwidth, 0 = unlimited")
+    args = parser.parse_args()
+
+    port = free_port()
+    standin = StandIn(port, args.link_kbps)
+    standin.up()
+    counter = [0]
+    alerts = [0]
+    started = time.time()
+    with tempfile.TemporaryDirectory() as folder:
+        uplink = Uplink("127.0.0.1", port, max_backoff=2, spool_path=os.path.join(folder, "spool.db"),
+                        spool_max_bytes=int(args.spool_mb * 1024 * 1024), replay_rate=args.replay_rate)
+        stop = threading.Event()
+        pad = "x" * int(args.bulk_kb * 1024)
+        producers = [threading.Thread(target=produce, args=(uplink, args.rate, stop, counter, pad), daemon=True)]
+        if args.alert_rate:
+            producers.append(threading.Thread(target=produce_alerts, args=(uplink, args.alert_rate, stop, alerts,
+                                                    PRIORITY_NORMAL if args.alerts_as_bulk else PRIORITY_CRITICAL),
+                                              daemon=True))
+        for producer in producers:
+            producer.start()
+        time.sleep(args.seconds)
+
+        recoveries = []
+        for cycle in range(args.cycles):
+            time.sleep(args.up)
+            standin.down()
+            print(f"🔌 Cycle {cycle + 1}: server down for {args.down:g}s")
+            time.sleep(args.down)
+            backlog = len(uplink.spool)
+            standin.up()
+            back_at = time.time()
+            print(f"🔋 Server back up with {backlog} events spooled")
+
+            while len(uplink.spool) and time.time() - back_at < args.drain_timeout:
+                time.sleep(0.05)
+            recoveries.append((backlog, back_at, time.time() - back_at))
+        stop.set()
+        for producer in producers:
+            producer.join()
+        produced = counter[0]
+        elapsed = time.time() - started
+
+        # Give the in-memory queue a moment to flush the live tail
+        time.sleep(1)
+        uplink.close()
+
+    with standin.lock:
+        received = list(standin.received)
+    seen = {}
+    alert_latency = []
+    for now, event in received:
+        if "alert" in event:
+            alert_latency.append(now - event["sent_at"])
+        else:
+            seen[event["n"]] = seen.get(event["n"], 0) + 1
+    alert_latency.sort()
+    delivered = len(seen)
+    duplicates = sum(count - 1 for count in seen.values())
+    evicted = uplink.spool.evicted
+
+    print(f"\n📊 {produced} events produced at {args.rate:g}/s")
+    print(f"📦 Bulk throughput {delivered / elapsed:.1f} events/s, {delivered * args.bulk_kb / elapsed:.0f} KB/s")
+    if args.alert_rate:
+        print(f"🚨 {len(alert_latency)} of {alerts[0]} alerts delivered | latency p50"
+              f" {percentile(alert_latency, 50) * 1000:.0f} ms, p95 {percentile(alert_latency, 95) * 1000:.0f} ms,"
+              f" p99 {percentile(alert_latency, 99) * 1000:.0f} ms")
+    print(f"📥 {delivered} delivered, {duplicates} duplicates, {evicted} evicted from the spool,"
+          f" {uplink.dropped} dropped from memory, {max(0, produced - delivered - evicted - uplink.dropped)} unaccounted")
+    for backlog, back_at, drain in recoveries:
+        live = sorted(now - event["sent_at"] for now, event in received
+                      if not event.get("replayed") and back_at <= now <= back_at + drain)
+        print(f"🔁 {backlog} spooled events replayed in {drain:.1f}s ({backlog / drain if drain else 0:.0f} events/s)"
+              f" | live delay meanwhile p50 {percentile(live, 50) * 1000:.0f} ms,"
+              f" p95 {percentile(live, 95) * 1000:.0f} ms")
+    return 0 if duplicates == 0 and produced - delivered - evicted - uplink.dropped <= 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
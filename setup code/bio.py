@@ -4,7 +4,6 @@ import numpy as np
 import board
 import busio
 import adafruit_mlx90614
-import requests
 
 from ads1115_driver import ADS1115Reader
 from max30102_driver import MAX30102
@@ -12,6 +11,7 @@ from processing import bandpass_filter, detect_r_peaks, calculate_heart_rate
 from respiration_calc import estimate_respiration
 from spo2_calc import calculate_spo2
 from ptt_processor import calculate_ptt, estimate_bp
+from uplink import Uplink
 
 # ================= SETTINGS =================
 fs_ecg = 250
@@ -38,7 +38,7 @@ config = load_config()
 plate = config.get("plate", "UNKNOWN")
 model_name = config.get("model", "UNKNOWN")
 server_ip = config.get("server_ip", "192.168.100.14")
-server_url = f"http://{server_ip}:5000/trigger"
+uplink = Uplink(server_ip, spool_path="bio-spool.db")
 
 # ================= MLX90614 SETUP =================
 i2c = busio.I2C(board.SCL, board.SDA)
@@ -153,11 +153,8 @@ def send_to_server(hr, spo2, rr, temp, sys_bp, dia_bp, bac):
         "bio": bio_data
     }
 
-    try:
-        res = requests.post(server_url, json=payload, timeout=3)
-        print(f"✅ Sent | HR: {hr:.2f} | SpO₂: {spo2:.2f}% | RR: {rr} | Temp: {temp}°C | BP: {sys_bp:.1f}/{dia_bp:.1f} | BAC: {bac}")
-    except Exception as e:
-        print(f"❌ Failed to send data: {e}")
+    uplink.send(payload)
+    print(f"📤 Queued | HR: {hr:.2f} | SpO₂: {spo2:.2f}% | RR: {rr} | Temp: {temp}°C | BP: {sys_bp:.1f}/{dia_bp:.1f} | BAC: {bac}")
 
 # ================= MAIN =================
 def main():
@@ -0,0 +1,152 @@
+import bisect
+
+# Bucket width of each rollup resolution, in seconds
+RESOLUTIONS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+
+# How far back each resolution is kept, in seconds
+RETENTION = {"1m": 24 * 3600, "15m": 7 * 24 * 3600, "1h": 90 * 24 * 3600}
+
+BIO_METRICS = ("heart_rate", "oxygen", "respiration_rate", "temperature", "alcohol", "systolic", "diastolic")
+
+
+def bio_values(bio):
+    """(metric, value) pairs worth aggregating from one bio reading.
+
+    bio.py sends 0 when a sensor could not produce a value, so zeros are
+    skipped for every metric except alcohol, where 0.0 is a real reading.
+    """
+    if not isinstance(bio, dict):
+        return
+    blood_pressure = bio.get("blood_pressure")
+    blood_pressure = blood_pressure if isinstance(blood_pressure, dict) else {}
+    for metric in BIO_METRICS:
+        value = blood_pressure.get(metric) if metric in ("systolic", "diastolic") else bio.get(metric)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if value == 0 and metric != "alcohol":
+            continue
+        yield metric, value
+
+
+def reading_time(received_at, entry):
+    """Time to file an entry's bio reading under: when it was received, or
+    for an event replayed from the edge spool, when the edge sent it
+    (never later than received_at, never past the longest retention)."""
+    sent_at = entry.get("sent_at")
+    if not entry.get("replayed") or isinstance(sent_at, bool) or not isinstance(sent_at, (int, float)):
+        return received_at
+    return max(received_at - max(RETENTION.values()), min(sent_at, received_at))
+
+
+class Series:
+    """min/max/sum/count buckets of one metric at one resolution."""
+
+    def __init__(self, width, max_buckets):
+        self.width = width
+        self.max_buckets = max_buckets
+        self.starts = []
+        self.buckets = []  # [min, max, sum, count], parallel to starts
+
+    def add(self, t, value):
+        start = int(t // self.width) * self.width
+        # Usually the newest bucket; late (replayed) readings find theirs by bisect
+        if self.starts and start == self.starts[-1]:
+            index = len(self.starts) - 1
+        else:
+            index = bisect.bisect_left(self.starts, start)
+        if index < len(self.starts) and self.starts[index] == start:
+            bucket = self.buckets[index]
+            bucket[0] = min(bucket[0], value)
+            bucket[1] = max(bucket[1], value)
+            bucket[2] += value
+            bucket[3] += 1
+            return start
+        self.set(start, value, value, value, 1)
+        return start
+
+    def set(self, start, low, high, total, count):
+        if self.starts and start <= self.starts[-1]:
+            index = bisect.bisect_left(self.starts, start)
+            if index < len(self.starts) and self.starts[index] == start:
+                self.buckets[index] = [low, high, total, count]
+                return
+            self.starts.insert(index, start)
+            self.buckets.insert(index, [low, high, total, count])
+        else:
+            self.starts.append(start)
+            self.buckets.append([low, high, total, count])
+
+        # Drop expired buckets in chunks so trimming stays amortized O(1)
+        overflow = len(self.starts) - self.max_buckets
+        if overflow > max(1, self.max_buckets // 4):
+            del self.starts[:overflow]
+            del self.buckets[:overflow]
+
+    def expire(self, before):
+        """Drop buckets starting before ``before``, returns how many."""
+        index = bisect.bisect_left(self.starts, before)
+        del self.starts[:index]
+        del self.buckets[:index]
+        return index
+
+    def query(self, since=None, until=None):
+        lo = max(0, len(self.starts) - self.max_buckets)
+        if since is not None:
+            lo = max(lo, bisect.bisect_left(self.starts, since))
+        hi = len(self.starts) if until is None else bisect.bisect_right(self.starts, until)
+        return [
+            {"t": start, "min": low, "max": high, "mean": total / count, "count": count}
+            for start, (low, high, total, count) in zip(self.starts[lo:hi], self.buckets[lo:hi])
+        ]
+
+
+class BioRollups:
+    """Per-plate bio rollups at every resolution, updated one reading at a time.
+
+    With track_dirty the (metric, resolution, start) keys touched since the
+    last pop_dirty() are remembered, so only changed buckets get persisted.
+    """
+
+    def __init__(self, track_dirty=False):
+        self.series = {}
+        self.track_dirty = track_dirty
+        self._dirty = set()
+
+    def _series(self, metric, resolution):
+        key = (metric, resolution)
+        if key not in self.series:
+            width = RESOLUTIONS[resolution]
+            self.series[key] = Series(width, RETENTION[resolution] // width)
+        return self.series[key]
+
+    def add(self, t, bio):
+        for metric, value in bio_values(bio):
+            for resolution in RESOLUTIONS:
+                start = self._series(metric, resolution).add(t, value)
+                if self.track_dirty:
+                    self._dirty.add((metric, resolution, start))
+
+    def query(self, metric, resolution, since=None, until=None):
+        series = self.series.get((metric, resolution))
+        return series.query(since, until) if series else []
+
+    def expire(self, now):
+        """Drop buckets older than their resolution's RETENTION, returns how many."""
+        return sum(series.expire(now - RETENTION[resolution])
+                   for (_, resolution), series in self.series.items())
+
+    def pop_dirty(self):
+        """Rows (metric, resolution, start, min, max, sum, count) changed since the last call."""
+        rows = []
+        for metric, resolution, start in self._dirty:
+            series = self.series[(metric, resolution)]
+            index = bisect.bisect_left(series.starts, start)
+            if index < len(series.starts) and series.starts[index] == start:
+                rows.append((metric, resolution, start, *series.buckets[index]))
+        self._dirty.clear()
+        return rows
+
+    def restore(self, rows):
+        for metric, resolution, start, low, high, total, count in rows:
+            if metric in BIO_METRICS and resolution in RESOLUTIONS:
+                self._series(metric, resolution).set(start, low, high, total, count)
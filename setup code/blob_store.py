@@ -0,0 +1,103 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+# Folder where decoded images are kept, one file per distinct image
+IMAGE_DIR = os.environ.get("IMAGE_DIR", "images")
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def guess_mimetype(head):
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+class BlobStore:
+    """Content-addressed image store: each image is decoded and written once,
+    and everything else refers to it by its sha256 hex digest."""
+
+    def __init__(self, root=IMAGE_DIR):
+        self.root = os.path.abspath(root)
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        # Totals for /metrics, counted once here and then kept up to date
+        self.count = 0
+        self.bytes_held = 0
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if DIGEST_RE.match(name):
+                    self.count += 1
+                    self.bytes_held += os.path.getsize(os.path.join(folder, name))
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        return bool(DIGEST_RE.match(digest)) and os.path.exists(self.path(digest))
+
+    def put(self, raw):
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.path(digest)
+        with self._lock:
+            # Already stored: refresh its age, retention counts from the last use
+            try:
+                os.utime(path)
+                return digest
+            except FileNotFoundError:
+                pass
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        # Write to a temp file first so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        with self._lock:
+            # A concurrent put of the same image may have stored it meanwhile;
+            # only the one that moves it into place counts it
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                os.utime(path)
+                return digest
+            os.replace(tmp_path, path)
+            self.count += 1
+            self.bytes_held += len(raw)
+        return digest
+
+    def remove_if_older(self, digest, before):
+        """Delete an image last stored before ``before`` (epoch seconds).
+
+        Returns the bytes freed, 0 if it was used since or is already gone.
+        """
+        path = self.path(digest)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime >= before:
+                    return 0
+                os.remove(path)
+            except FileNotFoundError:
+                return 0
+            self.count -= 1
+            self.bytes_held -= stat.st_size
+        return stat.st_size
+
+    def put_base64(self, b64):
+        """Store a base64 image from an edge payload, returns "" if there is
+        none. Raises ValueError if it isn't a string."""
+        if not b64:
+            return ""
+        if not isinstance(b64, str):
+            raise ValueError("Invalid image")
+        try:
+            raw = base64.b64decode(b64, validate=True)
+        except (binascii.Error, ValueError):
+            return ""
+        return self.put(raw) if raw else ""
@@ -0,0 +1,123 @@
+# On-demand MJPEG view of a detector's annotated frames (inner.py, outer.py).
+#
+# The detection loop hands every result to publish(), which only keeps a
+# reference and returns; nothing is drawn or encoded unless someone has
+# http://<device>:<port>/ open. The newest result is then annotated and
+# JPEG-encoded on the viewer's connection thread, at most max_fps times a
+# second and once per frame however many viewers there are.
+#
+# Headless devices run without any window; show_window() tells whether the
+# scripts should still open one (config.txt headless=1/0, otherwise only
+# when a display is attached).
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+DEBUG_PORT = 8081
+DEBUG_MAX_FPS = 5
+JPEG_QUALITY = 70
+
+PAGE = b"""<!doctype html><title>Detector debug view</title>
+<body style="margin:0;background:#111"><img src="/stream" style="width:100%"></body>"""
+
+
+def show_window(config):
+    """Whether to render into an OpenCV window: headless=1 never, headless=0
+    always, unset only when there is a display to show it on."""
+    headless = config.get("headless")
+    if headless is not None:
+        return headless != "1"
+    return sys.platform == "win32" or sys.platform == "darwin" or bool(os.environ.get("DISPLAY"))
+
+
+class DebugStream:
+    def __init__(self, host="127.0.0.1", port=DEBUG_PORT, max_fps=DEBUG_MAX_FPS, render=None):
+        self.max_fps = max_fps
+        self.render = render or (lambda result: result.plot())
+        self.viewers = 0
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._render_lock = threading.Lock()
+
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(PAGE)))
+                    self.end_headers()
+                    self.wfile.write(PAGE)
+                elif self.path == "/stream":
+                    stream._serve(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"🖥️ Debug view on http://{host}:{port}/ (renders only while open)")
+
+    @property
+    def active(self):
+        return self.viewers > 0
+
+    def publish(self, result):
+        """Offer the newest detection result; free when nobody is watching."""
+        if not self.viewers:
+            return
+        with self._cond:
+            self._item = result
+            self._seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_jpeg(self, seen, timeout=1.0):
+        # Wait for a frame newer than seen; the first viewer to ask renders it
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > seen, timeout):
+                return seen, None
+            seq, item = self._seq, self._item
+        with self._render_lock:
+            if self._jpeg_seq != seq:
+                _, buffer = cv2.imencode(".jpg", self.render(item), [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                self._jpeg, self._jpeg_seq = buffer.tobytes(), seq
+            return self._jpeg_seq, self._jpeg
+
+    def _serve(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+        with self._cond:
+            self.viewers += 1
+            seen = self._seq
+        try:
+            while True:
+                started = time.monotonic()
+                seen, jpeg = self._next_jpeg(seen)
+                if jpeg is None:
+                    continue
+                handler.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                    b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                handler.wfile.flush()
+                time.sleep(max(0.0, 1 / self.max_fps - (time.monotonic() - started)))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._cond:
+                self.viewers -= 1
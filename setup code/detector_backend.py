@@ -0,0 +1,150 @@
+# CPU inference backends for the YOLO detectors (inner.py, outer.py).
+#
+# load_detector() takes the same .pt weights the scripts always used and
+# returns an Ultralytics YOLO object backed by PyTorch, ONNX Runtime or
+# OpenVINO, so calling it still yields the usual Results (boxes, names,
+# plot()). The exported model is written next to the weights on first use
+# and reused until the .pt changes.
+#
+# int8=True adds post-training quantization calibrated on a local set of
+# images: a folder of typical camera frames, or a dataset .yaml. OpenVINO
+# quantizes during export (NNCF); for ONNX the FP32 export is quantized
+# with onnxruntime's static quantizer.
+#
+# The scripts take these from config.txt: backend=onnx, int8=1 and
+# calibration=<folder or .yaml>; without them they run PyTorch as before.
+import glob
+import os
+import tempfile
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+IMAGE_SIZE = 640
+CALIBRATION_IMAGES = 300  # at most this many calibration frames are used
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def exported_path(weights, backend, int8=False):
+    """Where the export of weights for backend lives (Ultralytics' own naming)."""
+    stem = os.path.splitext(weights)[0]
+    if backend == "pytorch":
+        return weights
+    if backend == "onnx":
+        return f"{stem}_int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def load_detector(weights, backend="pytorch", int8=False, calibration=None, imgsz=IMAGE_SIZE):
+    """YOLO model for weights on the given backend, exporting it first if needed."""
+    path = exported_path(weights, backend, int8)
+    if backend == "pytorch":
+        if int8:
+            print("⚠️ INT8 needs the onnx or openvino backend, running FP32 PyTorch")
+        return YOLO(weights)
+
+    if is_stale(path, weights):
+        if int8 and not calibration:
+            raise ValueError("INT8 quantization needs a calibration set (folder of images or dataset .yaml)")
+        print(f"⚙️ Exporting {weights} to {backend}{' INT8' if int8 else ''}, this takes a while once")
+        if backend == "onnx":
+            fp32 = exported_path(weights, "onnx")
+            if is_stale(fp32, weights):
+                YOLO(weights).export(format="onnx", imgsz=imgsz)
+            if int8:
+                quantize_onnx(fp32, path, calibration_images(calibration), imgsz)
+        else:
+            with calibration_yaml(calibration, weights) as data:
+                YOLO(weights).export(format="openvino", imgsz=imgsz, int8=int8, data=data)
+    return YOLO(path, task="detect")
+
+
+def is_stale(path, weights):
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(weights)
+
+
+# ---------- Calibration ----------
+def calibration_images(calibration, limit=CALIBRATION_IMAGES):
+    """Image files of a calibration folder, or of a dataset .yaml's val split."""
+    if calibration.endswith((".yaml", ".yml")):
+        from ultralytics.data.utils import check_det_dataset
+        dataset = check_det_dataset(calibration)
+        calibration = dataset["val"] if isinstance(dataset["val"], str) else dataset["val"][0]
+    files = sorted(path for path in glob.glob(os.path.join(calibration, "**", "*"), recursive=True)
+                   if path.lower().endswith(IMAGE_EXTENSIONS))
+    if not files:
+        raise ValueError(f"No calibration images found in {calibration}")
+    # Spread the picks over the whole set rather than the first few seconds of a recording
+    step = max(1, len(files) // limit)
+    return files[::step][:limit]
+
+
+@contextmanager
+def calibration_yaml(calibration, weights):
+    """Dataset .yaml for Ultralytics' calibration: the one passed in, or a
+    throwaway one around a plain image folder."""
+    if not calibration or calibration.endswith((".yaml", ".yml")):
+        yield calibration
+        return
+    names = YOLO(weights).names
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+        f.write(f"path: {os.path.abspath(calibration)}\ntrain: .\nval: .\nnames:\n")
+        f.writelines(f"  {index}: {name}\n" for index, name in names.items())
+    try:
+        yield f.name
+    finally:
+        os.remove(f.name)
+
+
+def letterbox(image, imgsz=IMAGE_SIZE):
+    """Same preprocessing as Ultralytics: keep aspect ratio, pad with grey,
+    RGB, 0..1, NCHW float32."""
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255
+
+
+def quantize_onnx(fp32_path, int8_path, images, imgsz=IMAGE_SIZE):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.files = iter(images)
+
+        def get_next(self):
+            for path in self.files:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {self.input_name: letterbox(image, imgsz)}
+            return None
+
+    input_name = onnx.load(fp32_path, load_external_data=False).graph.input[0].name
+    prepared = f"{os.path.splitext(int8_path)[0]}_prep.onnx"
+    quant_pre_process(fp32_path, prepared)
+    try:
+        # The detection head's concat/sigmoid outputs lose too much in 8 bits,
+        # so only convolutions are quantized
+        quantize_static(prepared, int8_path, Reader(input_name), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        op_types_to_quantize=["Conv"], per_channel=True)
+    finally:
+        os.remove(prepared)
+    # Ultralytics reads class names and image size from the model metadata
+    model = onnx.load(int8_path)
+    source = onnx.load(fp32_path, load_external_data=False)
+    del model.metadata_props[:]
+    model.metadata_props.extend(source.metadata_props)
+    onnx.save(model, int8_path)
@@ -0,0 +1,127 @@
+# Evidence images for detection events (inner.py, exterior.py), encoded
+# off the detection loop.
+#
+# submit() hands the frame and the event to a small pool of worker threads
+# and returns at once; if they are all busy and the queue is full, the
+# event is sent straight away without its image rather than holding up
+# inference or being lost. A worker crops the
+# frame to the detection box plus a margin, scales it down to max_side,
+# and picks the highest JPEG/WebP quality that fits the byte budget, then
+# base64-encodes it into the event as cv_image and passes it to send. OpenCV
+# releases the GIL while resizing and encoding, so the workers really run
+# in parallel with inference.
+import base64
+import queue
+import threading
+import time
+
+import cv2
+
+EVIDENCE_BUDGET = 48 * 1024  # bytes of encoded image per event
+EVIDENCE_MAX_SIDE = 640
+EVIDENCE_MARGIN = 0.25       # of the box size, added on every side
+EVIDENCE_FORMAT = "jpg"      # or "webp": smaller for the same quality, slower to encode
+EVIDENCE_WORKERS = 2
+EVIDENCE_QUEUE_SIZE = 16
+MIN_QUALITY = 30
+MAX_QUALITY = 90
+
+QUALITY_FLAG = {"jpg": cv2.IMWRITE_JPEG_QUALITY, "webp": cv2.IMWRITE_WEBP_QUALITY}
+
+
+def crop(image, box, margin=EVIDENCE_MARGIN):
+    """image cut to box (x1, y1, x2, y2 in its own pixels) grown by margin."""
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = box
+    pad_x = (x2 - x1) * margin
+    pad_y = (y2 - y1) * margin
+    left, top = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+    right, bottom = min(width, int(x2 + pad_x)), min(height, int(y2 + pad_y))
+    if right <= left or bottom <= top:
+        return image
+    return image[top:bottom, left:right]
+
+
+def fit(image, max_side=EVIDENCE_MAX_SIDE):
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def encode(image, budget=EVIDENCE_BUDGET, fmt=EVIDENCE_FORMAT):
+    """Encoded bytes at the best quality within budget. If even MIN_QUALITY
+    doesn't fit, the image is scaled down until it does."""
+    flag = QUALITY_FLAG[fmt]
+    while True:
+        # Binary search on quality, keeping the best encoding that fits
+        best = None
+        low, high = MIN_QUALITY, MAX_QUALITY
+        while low <= high:
+            quality = (low + high) // 2
+            _, buffer = cv2.imencode(f".{fmt}", image, [flag, quality])
+            if len(buffer) <= budget:
+                best = buffer
+                low = quality + 5
+            else:
+                high = quality - 5
+        height, width = image.shape[:2]
+        if best is not None or max(height, width) <= 64:
+            return (best if best is not None else buffer).tobytes()
+        image = cv2.resize(image, (width * 3 // 4, height * 3 // 4), interpolation=cv2.INTER_AREA)
+
+
+class EvidenceEncoder:
+    def __init__(self, send, workers=EVIDENCE_WORKERS, queue_size=EVIDENCE_QUEUE_SIZE, budget=EVIDENCE_BUDGET,
+                 max_side=EVIDENCE_MAX_SIDE, margin=EVIDENCE_MARGIN, fmt=EVIDENCE_FORMAT, on_encoded=None):
+        self.send = send  # send(event), e.g. queueing it on the uplink
+        self.budget = budget
+        self.max_side = max_side
+        self.margin = margin
+        self.fmt = fmt
+        self.on_encoded = on_encoded  # called with the seconds each encoding took
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self.encoded = 0
+        self.bytes_sent = 0
+        self.dropped = 0  # images left out of an event because the queue was full
+        self._workers = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, image, event, box=None):
+        """Queue event with image as its cv_image. The image must not be
+        modified afterwards. When the queue is full the event is sent without
+        an image and False is returned."""
+        try:
+            self._queue.put_nowait((image, event, box))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            self.send(event)
+            return False
+
+    def close(self, timeout=5.0):
+        for _ in self._workers:
+            self._queue.put((None, None, None))
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _run(self):
+        while True:
+            image, event, box = self._queue.get()
+            if image is None:
+                return
+            start = time.monotonic()
+            if box is not None:
+                image = crop(image, box, self.margin)
+            data = encode(fit(image, self.max_side), self.budget, self.fmt)
+            event = dict(event, cv_image=base64.b64encode(data).decode("utf-8"))
+            if self.on_encoded is not None:
+                self.on_encoded(time.monotonic() - start)
+            with self._lock:
+                self.encoded += 1
+                self.bytes_sent += len(data)
+            self.send(event)
@@ -7,13 +7,14 @@ import threading
 import xml.etree.ElementTree as ET
 import osmnx as ox
 import math
-import base64
 import json
-import requests
 from collections import deque
 from torchvision.transforms import Compose, Resize, ToTensor, Normalize
 from PIL import Image
 
+from evidence import EvidenceEncoder
+from uplink import Uplink, PRIORITY_NORMAL, PRIORITY_CRITICAL
+
 # ---------- Config Loader ----------
 def load_config(path='config.txt'):
     config = {}
@@ -28,7 +29,7 @@ config = load_config()
 PLATE = config.get("plate", "UNKNOWN")
 MODEL = config.get("model", "ExteriorCam")
 SERVER_IP = config.get("server_ip", "127.0.0.1")
-APP_URL = f"http://{SERVER_IP}:5000/trigger"
+uplink = Uplink(SERVER_IP, spool_path="exterior-spool.db")
 
 # ---------- MiDaS Setup ----------
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -53,20 +54,25 @@ FOLDER = "."  # Folder to watch for GPX files
 PROCESSED = set()
 
 # ---------- App Integration ----------
-def send_event_to_app(label, image):
-    _, buffer = cv2.imencode('.jpg', image)
-    img_base64 = base64.b64encode(buffer).decode('utf-8')
+# Sent on the uplink's critical lane, ahead of everything else
+CRITICAL_LABELS = {"COLLISION WARNING", "WRONG WAY DRIVING"}
+
+def queue_event(payload):
+    label = payload["cv_label"]
+    uplink.send(payload, priority=PRIORITY_CRITICAL if label in CRITICAL_LABELS else PRIORITY_NORMAL)
+
+# The image is downscaled, fitted in a byte budget and attached off the detection loop
+evidence = EvidenceEncoder(queue_event)
+
+def send_event_to_app(label, image, box=None):
     payload = {
         "cv_label": label,
-        "cv_image": img_base64,
         "vd_label": label,
         "plate": PLATE,
         "model": MODEL,
         "source": "exterior"
     }
-    try:
-        requests.post(APP_URL, json=payload)
-    except Exception as e:
-        print(f"⚠️ Failed to send to app: {e}")
+    if not evidence.submit(image.copy(), payload, box=box):
+        print(f"⚠️ Evidence encoder busy, sent '{label}' without an image")
 
 # The rest of the code remains the same (no need to repeat it here unless editing further).
@@ -0,0 +1,68 @@
+# Merge rules for a vehicle's "latest" state, shared by the live /trigger
+# handler and by crash recovery so both always agree.
+
+EXTERIOR_WARNING_LABELS = ["COLLISION WARNING", "WRONG WAY DRIVING", "LANE DEPARTURE", "MULTIPLE HAZARDS"]
+
+
+def new_latest():
+    return {
+        "interior": {},
+        "exterior": {},
+        "bio": {},
+        "vd_label": "normal",
+        "speed": {"actual": 0.0, "target": 0.0},
+    }
+
+
+def apply_event(latest, data):
+    """Merge one event (images already replaced by their *_image_id) into latest."""
+    # Replayed from an edge spool after an outage: live events sent since
+    # are newer, so these only belong in history and rollups
+    if data.get("replayed"):
+        return
+
+    source = data.get("source", "")
+
+    # ---------- INTERIOR ----------
+    if source == "interior":
+        latest["interior"] = {
+            "cv_label": data.get("cv_label", "No detection"),
+            "cv_image_id": data.get("cv_image_id", "")
+        }
+
+    # ---------- EXTERIOR ----------
+    elif source == "exterior":
+        cv_label = data.get("cv_label", "")
+        collision_warning = data.get("collision_warning", "")
+        lane_alert = data.get("lane_alert", "")
+
+        warnings = []
+        if cv_label in EXTERIOR_WARNING_LABELS:
+            warnings.append(cv_label)
+        if collision_warning == "true":
+            warnings.append("COLLISION WARNING")
+        if lane_alert:
+            warnings.append("LANE DEPARTURE")
+
+        latest["exterior"] = {
+            "cv_label": cv_label,
+            "exterior_image_id": data.get("exterior_image_id", ""),
+            "collision_warning": collision_warning,
+            "lane_alert": lane_alert,
+            "warnings": list(set(warnings))  # Remove duplicates
+        }
+
+    # ---------- BIOSIGNALS ----------
+    if "bio" in data:
+        latest["bio"] = data["bio"]
+
+    # ---------- VEHICLE DYNAMICS ----------
+    if "vd_label" in data:
+        latest["vd_label"] = data["vd_label"]
+
+    # ---------- SPEED ----------
+    if "actual_speed" in data or "target_speed" in data:
+        latest["speed"] = {
+            "actual": data.get("actual_speed", 0.0),
+            "target": data.get("target_speed", 0.0)
+        }
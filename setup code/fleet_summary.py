@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+
+from fleet_state import new_latest, apply_event
+
+# Interior labels that are not an alert
+INTERIOR_IDLE_LABELS = {"", "No detection", "none"}
+
+# Sliding windows reported by /fleet/summary, in minutes
+ALERT_WINDOWS = (5, 60)
+
+# Detections arrive as events and are counted once per event: a driver the
+# camera keeps seeing asleep raises a new alert every time. The other
+# categories are continuous readings, counted when they turn into an alert.
+EVENT_CATEGORIES = ("interior", "exterior")
+
+
+def vehicle_labels(latest):
+    """(category, label) pairs describing a vehicle's current latest state."""
+    labels = set()
+
+    cv_label = latest.get("interior", {}).get("cv_label", "")
+    if cv_label not in INTERIOR_IDLE_LABELS:
+        labels.add(("interior", cv_label))
+
+    for warning in latest.get("exterior", {}).get("warnings", []):
+        labels.add(("exterior", warning))
+
+    labels.add(("vd_label", str(latest.get("vd_label", "normal"))))
+
+    # Same thresholds the app notifies on; malformed readings count as absent
+    bio = latest.get("bio")
+    bio = bio if isinstance(bio, dict) else {}
+    blood_pressure = bio.get("blood_pressure")
+    blood_pressure = blood_pressure if isinstance(blood_pressure, dict) else {}
+    if number(bio.get("alcohol")) > 0:
+        labels.add(("bio", "alcohol"))
+    if number(blood_pressure.get("systolic")) >= 180 or number(blood_pressure.get("diastolic")) >= 120:
+        labels.add(("bio", "hypertension crisis"))
+    return frozenset(labels)
+
+
+def number(value):
+    # Same rule as bio_rollups.bio_values: ints and floats, but not bools
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+def is_alert(label):
+    category, value = label
+    return category != "vd_label" or value == "aggressive"
+
+
+def event_alerts(entry):
+    """Interior/exterior alert labels one event carries by itself."""
+    state = new_latest()
+    apply_event(state, entry)
+    return [label for label in vehicle_labels(state) if label[0] in EVENT_CATEGORIES and is_alert(label)]
+
+
+class FleetSummary:
+    """Fleet-wide label counts kept up to date by trigger().
+
+    Each plate's current labels are diffed against its previous ones, so an
+    update costs O(labels of one vehicle) and serving the summary costs
+    O(labels) whatever the fleet size. Alerts are also counted in per-minute
+    buckets for the sliding windows: every interior/exterior event carrying
+    one, and bio/driving alerts when they become active.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels = {}       # plate -> frozenset of labels
+        self._vehicles = {}     # label -> set of plates
+        self._alerts = {}       # label -> deque of [minute, count]
+
+    def update(self, plate, latest, entry=None, now=None, count_alerts=True):
+        """Refresh plate's labels from latest; entry is the event just applied."""
+        labels = vehicle_labels(latest)
+        alerts = event_alerts(entry) if entry is not None and count_alerts else []
+        with self._lock:
+            previous = self._labels.get(plate, frozenset())
+            if labels != previous or plate not in self._labels:
+                self._labels[plate] = labels
+
+                for label in previous - labels:
+                    plates = self._vehicles[label]
+                    plates.discard(plate)
+                    if not plates:
+                        del self._vehicles[label]
+
+                for label in labels - previous:
+                    self._vehicles.setdefault(label, set()).add(plate)
+                    if count_alerts and is_alert(label) and label[0] not in EVENT_CATEGORIES:
+                        alerts.append(label)
+
+            minute = int((now if now is not None else time.time()) // 60)
+            for label in alerts:
+                buckets = self._alerts.setdefault(label, deque())
+                if buckets and buckets[-1][0] == minute:
+                    buckets[-1][1] += 1
+                else:
+                    buckets.append([minute, 1])
+
+    def summary(self, include_plates=False, now=None):
+        minute = int((now if now is not None else time.time()) // 60)
+        result = {"vehicles": 0, "labels": {}, "alerts": {f"{window}m": {} for window in ALERT_WINDOWS}}
+        with self._lock:
+            result["vehicles"] = len(self._labels)
+
+            for (category, value), plates in self._vehicles.items():
+                counts = result["labels"].setdefault(category, {})
+                counts[value] = sorted(plates) if include_plates else len(plates)
+
+            for label, buckets in list(self._alerts.items()):
+                # Drop buckets that fell out of the longest window
+                while buckets and buckets[0][0] <= minute - max(ALERT_WINDOWS):
+                    buckets.popleft()
+                if not buckets:
+                    del self._alerts[label]
+                    continue
+                category, value = label
+                for window in ALERT_WINDOWS:
+                    total = sum(count for bucket_minute, count in buckets if bucket_minute > minute - window)
+                    if total:
+                        result["alerts"][f"{window}m"].setdefault(category, {})[value] = total
+        return result
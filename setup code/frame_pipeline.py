@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import deque
+
+
+class Frame:
+    __slots__ = ("index", "captured_at", "image", "timestamp")
+
+    def __init__(self, index, captured_at, image, timestamp=None):
+        self.index = index
+        self.captured_at = captured_at  # time.monotonic() when it was read
+        self.image = image
+        # On the source's clock (frame_source.py); the same as captured_at for a camera
+        self.timestamp = captured_at if timestamp is None else timestamp
+
+
+class LatestSlot:
+    """One-item mailbox between two stages.
+
+    put() always overwrites, so a slow consumer only ever sees the freshest
+    item and never works through a backlog of stale ones. Items replaced
+    before anyone took them are counted in ``overwritten``, unless put()
+    was asked to wait for the consumer instead.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._taken = True
+        self._closed = False
+        self.overwritten = 0
+
+    def put(self, item, wait=False):
+        with self._cond:
+            if wait:
+                self._cond.wait_for(lambda: self._taken or self._closed)
+            if not self._taken:
+                self.overwritten += 1
+            self._item = item
+            self._seq += 1
+            self._taken = False
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Wait for an item that hasn't been taken yet; None on timeout or close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._taken or self._closed, timeout):
+                return None
+            if self._taken:
+                return None
+            self._taken = True
+            self._cond.notify_all()
+            return self._item
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class PipelineStats:
+    """Per-stage rates, latencies and drop counters for a frame pipeline."""
+
+    def __init__(self, window=300):
+        self._lock = threading.Lock()
+        self._window = window
+        self._latencies = {}  # stage -> recent latencies in seconds
+        self._counts = {}
+        self._drops = {}
+        self._skips = {}  # left out on purpose, unlike drops
+        self._since = time.monotonic()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self._latencies:
+                self._latencies[stage] = deque(maxlen=self._window)
+            self._latencies[stage].append(seconds)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def drop(self, stage, count=1):
+        with self._lock:
+            self._drops[stage] = self._drops.get(stage, 0) + count
+
+    def skip(self, stage, count=1):
+        with self._lock:
+            self._skips[stage] = self._skips.get(stage, 0) + count
+
+    def summary(self):
+        """One line per stage since the previous summary(), then the counters restart."""
+        with self._lock:
+            elapsed = max(time.monotonic() - self._since, 1e-9)
+            lines = []
+            for stage, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                p50 = ordered[len(ordered) // 2] * 1000
+                p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+                line = (f"{stage:>10}: {self._counts.get(stage, 0) / elapsed:5.1f}/s"
+                        f" | p50 {p50:6.1f} ms | p95 {p95:6.1f} ms")
+                lines.append(line + self._counters(stage))
+            for stage in (self._drops.keys() | self._skips.keys()) - self._latencies.keys():
+                lines.append(f"{stage:>10}:" + self._counters(stage)[2:])
+            self._latencies.clear()
+            self._counts.clear()
+            self._drops.clear()
+            self._skips.clear()
+            self._since = time.monotonic()
+        return "\n".join(lines)
+
+    def _counters(self, stage):
+        text = ""
+        if stage in self._skips:
+            text += f" | skipped {self._skips[stage]}"
+        if stage in self._drops:
+            text += f" | dropped {self._drops[stage]}"
+        return text
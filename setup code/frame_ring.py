@@ -0,0 +1,234 @@
+# Last few seconds of camera frames, kept JPEG-compressed in a fixed
+# amount of memory, and alert clips cut from them (inner.py).
+#
+# offer() only drops the frame into a one-slot mailbox; a recorder thread
+# downscales and JPEG-encodes at most record_fps of them into the ring.
+# The ring evicts its oldest frames whenever it holds more than max_bytes
+# or more than `seconds` of video, so its size stays flat however long the
+# drive lasts.
+#
+# clip() asks for the frames from pre seconds before an alert to post
+# seconds after it. An alert that comes while the previous clip is still
+# waiting for its post-roll extends that clip (up to the ring's length)
+# instead of starting another one, so a burst of alerts is one file. A
+# background thread waits for the post-roll to be recorded, then writes the
+# JPEGs it already has as they are into an MJPEG AVI, without decoding or
+# re-encoding anything. The oldest clips are deleted once clips/ holds more
+# than clip_dir_bytes.
+import os
+import queue
+import struct
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from frame_pipeline import LatestSlot
+
+RING_MAX_BYTES = 32 * 1024 * 1024
+RING_SECONDS = 30
+RECORD_FPS = 10
+RECORD_MAX_SIDE = 640
+RECORD_QUALITY = 70
+CLIP_PRE = 10   # seconds before the alert
+CLIP_POST = 5   # seconds after it
+CLIP_DIR = "clips"
+CLIP_DIR_MAX_BYTES = 512 * 1024 * 1024
+
+
+class FrameRing:
+    def __init__(self, max_bytes=RING_MAX_BYTES, seconds=RING_SECONDS, fps=RECORD_FPS, max_side=RECORD_MAX_SIDE,
+                 quality=RECORD_QUALITY, clip_dir=CLIP_DIR, clip_dir_bytes=CLIP_DIR_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.seconds = seconds
+        self.fps = fps
+        self.max_side = max_side
+        self.quality = quality
+        self.clip_dir = clip_dir
+        self.clip_dir_bytes = clip_dir_bytes
+        self._frames = deque()  # (monotonic capture time, JPEG bytes), oldest first
+        self._lock = threading.Lock()
+        self.bytes_held = 0
+        self.evicted = 0
+        self.clips = 0
+        self.extended = 0  # alerts folded into a clip that was still open
+        self.rotated = 0   # old clips deleted to stay within clip_dir_bytes
+        self._open = None  # [start, end, path] of the clip still waiting for its post-roll
+        self._incoming = LatestSlot()
+        self._exports = queue.Queue()
+        self._running = True
+        self._recorder = threading.Thread(target=self._record, daemon=True)
+        self._recorder.start()
+        self._exporter = threading.Thread(target=self._export, daemon=True)
+        self._exporter.start()
+
+    # ---------- Recording ----------
+    def offer(self, image, captured_at=None):
+        """Hand over a frame; never blocks. image must not be modified afterwards."""
+        self._incoming.put((time.monotonic() if captured_at is None else captured_at, image))
+
+    def _record(self):
+        next_at = 0.0
+        while self._running:
+            item = self._incoming.get(timeout=1)
+            if item is None:
+                continue
+            captured_at, image = item
+            if captured_at < next_at:
+                continue
+            next_at = captured_at + 1 / self.fps
+            height, width = image.shape[:2]
+            scale = self.max_side / max(height, width)
+            if scale < 1:
+                image = cv2.resize(image, (round(width * scale), round(height * scale)),
+                                   interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                self._append(captured_at, buffer.tobytes())
+
+    def _append(self, captured_at, data):
+        with self._lock:
+            self._frames.append((captured_at, data))
+            self.bytes_held += len(data)
+            while self._frames and (self.bytes_held > self.max_bytes
+                                    or captured_at - self._frames[0][0] > self.seconds):
+                _, old = self._frames.popleft()
+                self.bytes_held -= len(old)
+                self.evicted += 1
+
+    def window(self, start, end):
+        """References to the frames captured between start and end."""
+        with self._lock:
+            return [(t, data) for t, data in self._frames if start <= t <= end]
+
+    def status(self):
+        with self._lock:
+            count = len(self._frames)
+            span = self._frames[-1][0] - self._frames[0][0] if count > 1 else 0.0
+        return (f"{count} frames, {span:.0f}s, {self.bytes_held / 1024 / 1024:.1f}"
+                f"/{self.max_bytes / 1024 / 1024:.0f} MB, {self.evicted} evicted, {self.clips} clips"
+                f" ({self.extended} extended, {self.rotated} rotated)")
+
+    # ---------- Clips ----------
+    def clip(self, label, at=None, pre=CLIP_PRE, post=CLIP_POST):
+        """Export pre seconds before and post seconds after at (monotonic,
+        default now) once they are recorded; returns the file it will be written to.
+        While the previous clip is still open and overlaps, it is extended instead."""
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            current = self._open
+            if current is not None and at - pre <= current[1] and at + post - current[0] <= self.seconds:
+                current[1] = max(current[1], at + post)
+                self.extended += 1
+                return current[2]
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label.replace(' ', '_')}.avi"
+            path = os.path.join(self.clip_dir, name)
+            current = self._open = [at - pre, at + post, path]
+        self._exports.put(current)
+        return path
+
+    def _export(self):
+        while True:
+            item = self._exports.get()
+            if item is None:
+                return
+            # Wait for the post-roll, which later alerts may push back; a
+            # recorder that stopped gets a second's grace
+            while self._running:
+                with self._lock:
+                    end = item[1]
+                if time.monotonic() >= end + 1 / self.fps:
+                    break
+                time.sleep(min(0.5, max(0.0, end - time.monotonic()) + 0.05))
+            with self._lock:
+                if self._open is item:
+                    self._open = None
+                start, end, path = item
+            frames = self.window(start, end)
+            if not frames:
+                print(f"⚠️ No frames recorded for {path}")
+                continue
+            os.makedirs(self.clip_dir, exist_ok=True)
+            write_mjpeg_avi(path, frames)
+            self.clips += 1
+            print(f"🎬 Saved {len(frames)} frames ({frames[-1][0] - frames[0][0]:.1f}s) to {path}")
+            self._rotate()
+
+    def _rotate(self):
+        # Delete the oldest clips until the folder fits, always keeping the newest
+        clips = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(self.clip_dir) if entry.name.endswith(".avi"))
+        total = sum(size for _, size, _ in clips)
+        for _, size, path in clips[:-1]:
+            if total <= self.clip_dir_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"⚠️ Couldn't delete old clip {path}: {e}")
+                continue
+            total -= size
+            self.rotated += 1
+
+    def close(self):
+        """Stop recording and write clips still waiting, with what was recorded."""
+        self._running = False
+        self._incoming.close()
+        self._exports.put(None)
+        self._exporter.join(10)
+
+
+def write_mjpeg_avi(path, frames):
+    """Write (time, JPEG bytes) frames as an MJPEG AVI at their average rate."""
+    width, height = jpeg_size(frames[0][1])
+    duration = frames[-1][0] - frames[0][0]
+    fps = max(1, round((len(frames) - 1) / duration)) if duration > 0 else RECORD_FPS
+    sizes = [len(data) for _, data in frames]
+    index, offset = [], 4  # idx1 offsets count from the "movi" fourcc
+    for size in sizes:
+        index.append(struct.pack("<4sIII", b"00dc", 0x10, offset, size))
+        offset += 8 + size + size % 2  # chunks are word aligned
+    movi_size = offset
+    index = b"".join(index)
+    max_frame = max(sizes)
+
+    avih = struct.pack("<IIIIIIIIII16x", 1000000 // fps, max_frame * fps, 0, 0x10, len(frames), 0, 1,
+                       max_frame, width, height)
+    strh = struct.pack("<4s4sIHHIIIIIIIIhhhh", b"vids", b"MJPG", 0, 0, 0, 0, 1, fps, 0, len(frames),
+                       max_frame, 0xFFFFFFFF, 0, 0, 0, width, height)
+    strf = struct.pack("<IiiHH4sIiiII", 40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0)
+    strl = _list(b"strl", _chunk(b"strh", strh) + _chunk(b"strf", strf))
+    hdrl = _list(b"hdrl", _chunk(b"avih", avih) + strl)
+    riff_size = 4 + len(hdrl) + 8 + movi_size + 8 + len(index)
+
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", riff_size) + b"AVI ")
+        f.write(hdrl)
+        f.write(b"LIST" + struct.pack("<I", movi_size) + b"movi")
+        for _, data in frames:
+            f.write(b"00dc" + struct.pack("<I", len(data)))
+            f.write(data)
+            if len(data) % 2:
+                f.write(b"\0")
+        f.write(_chunk(b"idx1", index))
+
+
+def _chunk(fourcc, data):
+    return fourcc + struct.pack("<I", len(data)) + data + b"\0" * (len(data) % 2)
+
+
+def _list(kind, data):
+    return b"LIST" + struct.pack("<I", 4 + len(data)) + kind + data
+
+
+def jpeg_size(data):
+    """(width, height) from a JPEG's SOF marker, without decoding it."""
+    i = 2
+    while i + 9 < len(data):
+        marker, length = data[i + 1], struct.unpack(">H", data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    raise ValueError("No JPEG frame header found")
@@ -0,0 +1,117 @@
+# Where the CV scripts get their frames from (inner.py, outer.py).
+#
+# open_source() turns config.txt's source= into something with the
+# cv2.VideoCapture read()/release() interface: a camera index (the default,
+# 0), a video file, or a folder of images such as OUTER/detected_stop/.
+# After every read(), .timestamp is that frame's time in seconds on the
+# source's own clock: monotonic time for a camera, the position in a video,
+# index / fps for an image folder.
+#
+# Files replay either in "realtime", paced like the camera they stand in
+# for, or "fast", as quickly as the script consumes them. A fast source is
+# lossless (its frames must all be processed, the pipeline waits for them
+# rather than dropping any), which makes runs over the same files
+# reproducible.
+import glob
+import os
+import time
+
+import cv2
+
+REPLAY_MODES = ("realtime", "fast")
+IMAGE_FPS = 10  # frame rate an image folder is replayed at
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class CameraSource:
+    lossless = False
+
+    def __init__(self, index=0):
+        self.cap = cv2.VideoCapture(index)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.timestamp = None
+
+    def read(self):
+        ret, frame = self.cap.read()
+        self.timestamp = time.monotonic()
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class ReplaySource:
+    """Base for file sources: paces frames to their timestamps in realtime mode."""
+
+    def __init__(self, mode):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode {mode!r}, expected one of {', '.join(REPLAY_MODES)}")
+        self.realtime = mode == "realtime"
+        self.lossless = not self.realtime
+        self.timestamp = None
+        self._started = None  # (wall clock, source time) of the first frame
+
+    def _pace(self, timestamp):
+        self.timestamp = timestamp
+        if not self.realtime:
+            return
+        if self._started is None:
+            self._started = (time.monotonic(), timestamp)
+            return
+        due = self._started[0] + timestamp - self._started[1]
+        time.sleep(max(0.0, due - time.monotonic()))
+
+
+class VideoSource(ReplaySource):
+    def __init__(self, path, mode="realtime"):
+        super().__init__(mode)
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Can't open video {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self._index = 0
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if ret:
+            # Container timestamps when there are any, frame count otherwise
+            position = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            self._pace(position if position > 0 or self._index == 0 else self._index / self.fps)
+            self._index += 1
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageFolderSource(ReplaySource):
+    def __init__(self, folder, mode="realtime", fps=IMAGE_FPS):
+        super().__init__(mode)
+        self.files = sorted(path for path in glob.glob(os.path.join(folder, "*"))
+                            if path.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise ValueError(f"No images in {folder}")
+        self.fps = fps
+        self._index = 0
+
+    def read(self):
+        while self._index < len(self.files):
+            frame = cv2.imread(self.files[self._index])
+            self._index += 1
+            if frame is not None:
+                self._pace((self._index - 1) / self.fps)
+                return True, frame
+            print(f"⚠️ Skipping unreadable {self.files[self._index - 1]}")
+        return False, None
+
+    def release(self):
+        pass
+
+
+def open_source(source="0", mode="realtime", fps=IMAGE_FPS):
+    """Camera index, video file or image folder, by what source looks like."""
+    if source.isdigit():
+        return CameraSource(int(source))
+    if os.path.isdir(source):
+        return ImageFolderSource(source, mode, fps)
+    return VideoSource(source, mode)
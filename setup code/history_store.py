@@ -0,0 +1,177 @@
+import bisect
+import os
+
+from fleet_state import new_latest, apply_event
+
+# Number of history entries kept per plate (oldest are dropped first)
+HISTORY_MAX_ENTRIES = int(os.environ.get("HISTORY_MAX_ENTRIES", "5000"))
+
+# A full entry is stored every this many entries, the rest are deltas
+KEYFRAME_INTERVAL = 32
+
+
+def encode_delta(previous, entry):
+    """Fields of entry that differ from previous, and the keys it dropped."""
+    changed = {key: value for key, value in entry.items() if key not in previous or previous[key] != value}
+    removed = [key for key in previous if key not in entry]
+    return changed, removed
+
+
+def apply_delta(previous, delta):
+    changed, removed = delta
+    entry = {key: value for key, value in previous.items() if key not in removed} if removed else dict(previous)
+    entry.update(changed)
+    return entry
+
+
+class HistoryStore:
+    """Bounded per-plate history indexed by numeric receive time.
+
+    Every entry gets a sequence number that never changes, so a client can
+    resume from the ``cursor`` it got on its previous request and only
+    receive what arrived since.
+
+    Entries are kept as deltas against the previous entry, with a keyframe
+    (the full entry plus the vehicle's latest state after it) every
+    KEYFRAME_INTERVAL entries. Reading a range decodes forward from the
+    keyframe before it, so the cost is O(KEYFRAME_INTERVAL + k).
+    """
+
+    def __init__(self, max_entries=HISTORY_MAX_ENTRIES, entries=(), first_seq=0, state=None):
+        self.max_entries = max_entries
+        self._times = []
+        self._records = []  # (True, entry, state) keyframes or (False, changed, removed) deltas
+        self._first_seq = first_seq  # sequence number of self._records[0]
+        self._last_entry = None
+        self._since_keyframe = 0
+
+        # Restored history: the keyframe states are rebuilt from state, the
+        # vehicle's state before the first entry, or from an empty vehicle
+        # when that isn't known
+        state = dict(state) if state is not None else new_latest()
+        for entry in entries:
+            apply_event(state, entry)
+            self.append(entry["received_at"], entry, state)
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def next_seq(self):
+        return self._first_seq + len(self._records)
+
+    def append(self, received_at, entry, state):
+        """Store entry; state is the vehicle's latest state after it.
+
+        Returns ``(seq, delta)`` where delta is None for a keyframe.
+        """
+        # Keep the time index sorted even if the clock steps backwards
+        if self._times and received_at < self._times[-1]:
+            received_at = self._times[-1]
+
+        seq = self.next_seq
+        if self._last_entry is None or self._since_keyframe + 1 >= KEYFRAME_INTERVAL:
+            delta = None
+            self._records.append((True, entry, dict(state)))
+            self._since_keyframe = 0
+        else:
+            delta = encode_delta(self._last_entry, entry)
+            self._records.append((False, *delta))
+            self._since_keyframe += 1
+        self._times.append(received_at)
+        self._last_entry = entry
+
+        # Trim in chunks so the cost of deleting from the front is amortized,
+        # always cutting at a keyframe so the rest can still be decoded
+        overflow = len(self._records) - self.max_entries
+        if overflow > max(1, self.max_entries // 4):
+            cut = overflow
+            while cut > 0 and not self._records[cut][0]:
+                cut -= 1
+            if cut:
+                del self._times[:cut]
+                del self._records[:cut]
+                self._first_seq += cut
+        return seq, delta
+
+    def expire(self, before):
+        """Drop entries received before ``before`` (epoch seconds).
+
+        The cut is made at the last keyframe at or before the first entry
+        kept, and the newest keyframe and its deltas always stay, so up to
+        KEYFRAME_INTERVAL expired entries can linger. Returns how many
+        entries were dropped.
+        """
+        cut = min(bisect.bisect_left(self._times, before), len(self._records) - 1)
+        while cut > 0 and not self._records[cut][0]:
+            cut -= 1
+        if cut <= 0:
+            return 0
+        del self._times[:cut]
+        del self._records[:cut]
+        self._first_seq += cut
+        return cut
+
+    def window(self, since=None, until=None, limit=None, cursor=None):
+        """Return the ``(first_seq, end_seq)`` range matching a query.
+
+        ``since`` is exclusive and ``until`` inclusive, both in epoch seconds.
+        ``cursor`` is the sequence number of the first entry to return.
+        ``end_seq`` is the cursor a client should resume from.
+        """
+        start = max(0, len(self._records) - self.max_entries)
+        if since is not None:
+            start = max(start, bisect.bisect_right(self._times, since))
+        if cursor is not None:
+            start = max(start, cursor - self._first_seq)
+
+        end = len(self._records)
+        if until is not None:
+            end = min(end, bisect.bisect_right(self._times, until))
+        if limit is not None:
+            end = min(end, start + max(limit, 0))
+        end = max(start, end)
+        return self._first_seq + start, self._first_seq + end
+
+    def _walk(self, first_seq, end_seq, with_state):
+        # Decode forward from the keyframe at or before first_seq, yielding
+        # (entry, state) for every held entry in [first_seq, end_seq)
+        start = max(first_seq - self._first_seq, len(self._records) - self.max_entries, 0)
+        end = min(end_seq - self._first_seq, len(self._records))
+        if start >= end:
+            return
+        index = start
+        while not self._records[index][0]:
+            index -= 1
+
+        entry = state = None
+        for index in range(index, end):
+            is_keyframe, first, second = self._records[index]
+            if is_keyframe:
+                entry = first
+                if with_state:
+                    state = dict(second)
+            else:
+                entry = apply_delta(entry, (first, second))
+                if with_state:
+                    apply_event(state, entry)
+            if index >= start:
+                yield entry, state
+
+    def slice(self, first_seq, end_seq):
+        """Entries with first_seq <= seq < end_seq that are still held."""
+        return [entry for entry, _ in self._walk(first_seq, end_seq, False)]
+
+    def snapshots(self, first_seq, end_seq):
+        """Like slice(), but each item is the vehicle's full latest state
+        right after that entry instead of the entry itself."""
+        return [
+            {"timestamp": entry.get("timestamp"), "received_at": entry.get("received_at"),
+             "source": entry.get("source", ""), **state}
+            for entry, state in self._walk(first_seq, end_seq, True)
+        ]
+
+    def query(self, since=None, until=None, limit=None, cursor=None):
+        """Return ``(entries, next_cursor)`` for the requested window."""
+        first_seq, end_seq = self.window(since, until, limit, cursor)
+        return self.slice(first_seq, end_seq), end_seq
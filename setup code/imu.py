@@ -1,11 +1,11 @@
 # this code is targetting the classification of the driver behavior if aggressive , keen , normal , smooth
 # and measuring the actual speed of the driver and compare it with the read sign
 import time
-import requests
 import joblib
 import pandas as pd
 import numpy as np
 from mpu6050 import mpu6050
+from uplink import Uplink, PRIORITY_LOW
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -26,7 +26,7 @@ config = load_config()
 plate = config.get("PLATE", "UNKNOWN")
 model_name = config.get("MODEL", "GENERIC")
 server_ip = config.get("SERVER_IP", "172.20.10.5")
-server_url = f"http://{server_ip}:5000/trigger"
+uplink = Uplink(server_ip, spool_path="imu-spool.db")
 
 # === Initialize model and IMU ===
 rf_model = joblib.load("/home/pop/Desktop/monitoring/rf_model.pkl")
@@ -65,7 +65,7 @@ def get_vd_label(accel, gyro):
     return prediction[0]
 
 # === Main loop ===
-print(f"🚗 Starting VD + Speed sender for car: {plate} ({model_name}) to {server_url}")
+print(f"🚗 Starting VD + Speed sender for car: {plate} ({model_name}) to {uplink.url}")
 
 try:
     while True:
@@ -101,11 +101,10 @@ try:
                 "vd_label": vd_label
             }
 
-            try:
-                res = requests.post(server_url, json=payload)
-                print(f"✅ Sent: Speed={speed_kmh:.2f} km/h, Label={vd_label}, Status={res.status_code}")
-            except Exception as e:
-                print(f"❌ Failed to send: {e}")
+            # Never blocks the 10 Hz loop, the uplink worker does the network I/O
+            # A newer sample replaces one still waiting to go out
+            uplink.send(payload, priority=PRIORITY_LOW, coalesce_key="imu")
+            print(f"📤 Queued: Speed={speed_kmh:.2f} km/h, Label={vd_label} ({uplink.pending()} waiting)")
 
             last_sent = current_time
 
@@ -1,10 +1,17 @@
 import cv2
-from ultralytics import YOLO
-import requests
-import base64
 import threading
 import time
 
+from debug_stream import DebugStream, show_window, DEBUG_MAX_FPS
+from detector_backend import load_detector
+from evidence import EvidenceEncoder
+from frame_pipeline import Frame, LatestSlot, PipelineStats
+from frame_ring import FrameRing, RING_MAX_BYTES, CLIP_DIR_MAX_BYTES
+from frame_source import open_source, IMAGE_FPS
+from motion_gate import MotionGate, RateController, MOTION_THRESHOLD
+from results_log import ResultsLog
+from uplink import Uplink, Cooldowns, PRIORITY_NORMAL, PRIORITY_CRITICAL
+
 # Load configuration
 def load_config(path='config.txt'):
     config = {}
@@ -18,7 +25,7 @@ config = load_config()
 plate = config.get("plate", "UNKNOWN")
 model_name = config.get("model", "InteriorCam")
 server_ip = config.get("server_ip", "127.0.0.1")
-server_url = f"http://{server_ip}:5000/trigger"
+uplink = Uplink(server_ip, spool_path="inner-spool.db")
 
 # Labels for illegal activities
 illegal_labels = {
@@ -29,67 +36,191 @@ illegal_labels = {
     5: 'smoking'
 }
 
-# Load YOLO model
-model = YOLO("C:/Users/Ahmed ehab/OneDrive - Future University in Egypt/Desktop/mpnitoring app/best.pt")
-
-# Initialize camera
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-
-# Function to send data to server
+# Sent on the uplink's critical lane, ahead of everything else
+critical_labels = {'sleep'}
+
+# Seconds before the same label is sent again; the dangerous ones repeat sooner
+cooldowns = Cooldowns({'sleep': 2, 'mobile use': 5, 'smoking': 10, 'drinking': 30, 'eating': 30}, default=10)
+
+# Load YOLO model on the configured backend (pytorch, onnx or openvino)
+model = load_detector("C:/Users/Ahmed ehab/OneDrive - Future University in Egypt/Desktop/mpnitoring app/best.pt",
+                      backend=config.get("backend", "pytorch"), int8=config.get("int8") == "1",
+                      calibration=config.get("calibration"))
+
+# Inference only runs when the cabin changed, as often as cpu_budget (share of
+# one core) allows, and at least min_rate times a second so a motionless
+# sleeping driver is still caught
+gate = MotionGate(float(config.get("motion_threshold", MOTION_THRESHOLD)))
+latency_budget = config.get("latency_budget")
+controller = RateController(cpu_budget=float(config.get("cpu_budget", 0.5)),
+                            min_rate=float(config.get("min_rate", 1)),
+                            latency_budget=float(latency_budget) if latency_budget else None)
+# A lossless replay reports this fixed cost (seconds per inference,
+# replay_cost=) to the controller instead of the measured one: measured
+# costs vary from run to run and would change which frames get inferred
+replay_cost = float(config.get("replay_cost", 0.05))
+
+# A local window only with a display attached (or headless=0); debug_port=<port>
+# adds an MJPEG view that only renders while someone is watching it
+show = show_window(config)
+debug = DebugStream(config.get("debug_host", "127.0.0.1"), int(config["debug_port"]),
+                    float(config.get("debug_fps", DEBUG_MAX_FPS))) if config.get("debug_port") else None
+
+# Compressed last seconds of video, cut into a clip around alerts (one per
+# burst); clips/ is kept under clips_mb by deleting the oldest
+ring = FrameRing(max_bytes=int(config.get("ring_mb", RING_MAX_BYTES // 1024 // 1024)) * 1024 * 1024,
+                 clip_dir_bytes=int(config.get("clips_mb", CLIP_DIR_MAX_BYTES // 1024 // 1024)) * 1024 * 1024)
+
+# Camera by default; source=<video file or image folder> replays it instead,
+# replay=realtime or fast (every frame, as quickly as inference takes them)
+source = open_source(config.get("source", "0"), config.get("replay", "realtime"),
+                     float(config.get("replay_fps", IMAGE_FPS)))
+
+# results_log=<file> records every inferred frame, for benchmarks and regression runs
+log = ResultsLog(config["results_log"]) if config.get("results_log") else None
+
+# Queue data for the server; the uplink worker sends it in the background
 def send_data(data):
-    try:
-        response = requests.post(server_url, json=data)
-        print(f"✅ Sent '{data['cv_label']}' to {server_url}: {response.json()}")
-    except Exception as e:
-        print("❌ Error:", e)
-
-frame_skip = 1  # Process every frame
-frame_count = 0
-last_sent_time = 0
-send_interval = 10  # seconds
-
-# Main loop
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    frame_count += 1
-    if frame_count % frame_skip != 0:
-        continue
-
-    small_frame = cv2.resize(frame, (640, 480))
-    results = model(small_frame)
-
-    current_time = time.time()
-
-    for r in results:
-        boxes = r.boxes
-        if boxes is not None and len(boxes) > 0:
-            for box in boxes:
-                class_id = int(box.cls[0])
-                if class_id in illegal_labels and current_time - last_sent_time >= send_interval:
-                    label = illegal_labels[class_id]
-                    _, buffer = cv2.imencode('.jpg', frame)
-                    img_base64 = base64.b64encode(buffer).decode('utf-8')
-
-                    data = {
-                        "plate": plate,
-                        "model": model_name,
-                        "cv_label": label,
-                        "cv_image": img_base64,
-                        "source": "interior"
-                    }
-
-                    threading.Thread(target=send_data, args=(data,)).start()
-                    last_sent_time = current_time
-
-    frame_with_boxes = r.plot()
-    cv2.imshow("YOLO Detection", frame_with_boxes)
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+    priority = PRIORITY_CRITICAL if data['cv_label'] in critical_labels else PRIORITY_NORMAL
+    uplink.send(data, priority=priority)
+    print(f"📤 Queued '{data['cv_label']}' for {uplink.url} ({uplink.pending()} waiting)")
+
+# ---------- Pipeline ----------
+# capture -> [latest frame] -> inference -> [latest result] -> render (main thread)
+#                                        -> evidence encoder pool -> uplink
+# Capture never waits on inference: a frame inference hasn't picked up yet
+# is simply replaced by the next one, so a detection is at most one
+# inference behind the camera instead of a queue of stale frames. Only a
+# fast replay waits, so that every frame of the file is inferred.
+frames = LatestSlot()
+results_slot = LatestSlot()
+stats = PipelineStats()
+# Crops to the detection, fits it in a byte budget and queues it, off the inference thread
+evidence = EvidenceEncoder(send_data, on_encoded=lambda seconds: stats.observe("evidence", seconds))
+running = threading.Event()
+running.set()
+stats_interval = 5  # seconds between stage reports
+
+def capture_loop():
+    index = 0
+    while running.is_set():
+        start = time.monotonic()
+        ret, frame = source.read()
+        if not ret:
+            break
+        now = time.monotonic()
+        stats.observe("capture", now - start)
+        frames.put(Frame(index, now, frame, source.timestamp), wait=source.lossless)
+        ring.offer(frame, now)
+        index += 1
+    frames.close()
+
+def inference_loop():
+    # Runs until capture has stopped and its last frame is done
+    dropped = 0
+    while True:
+        frame = frames.get(timeout=1)
+        if frame is None:
+            if frames.closed:
+                break
+            continue
+        if frames.overwritten > dropped:
+            stats.drop("inference", frames.overwritten - dropped)
+            dropped = frames.overwritten
+
+        start = time.monotonic()
+        moved = gate.moved(frame.image)
+        stats.observe("gate", time.monotonic() - start)
+        # On the source's clock and, for a lossless replay, a fixed cost, so
+        # that replay gates the same frames every run
+        if not controller.due(frame.timestamp, moved):
+            stats.skip("inference")
+            continue
+        gate.mark()
+
+        start = time.monotonic()
+        small_frame = cv2.resize(frame.image, (640, 480))
+        results = model(small_frame, verbose=False)
+        done = time.monotonic()
+        stats.observe("inference", done - start)
+        stats.observe("detection", done - frame.captured_at)
+        if source.lossless:
+            controller.observe(frame.timestamp, replay_cost)
+        else:
+            controller.observe(frame.timestamp, done - start, latency=done - frame.captured_at)
+        if log:
+            log.write(frame.index, frame.timestamp, results, done - start, done - frame.captured_at)
+
+        # Boxes are in small_frame pixels, the evidence comes from the full frame
+        scale_x = frame.image.shape[1] / small_frame.shape[1]
+        scale_y = frame.image.shape[0] / small_frame.shape[0]
+        for r in results:
+            boxes = r.boxes
+            if boxes is not None and len(boxes) > 0:
+                for box in boxes:
+                    class_id = int(box.cls[0])
+                    if class_id in illegal_labels and cooldowns.ready(illegal_labels[class_id], frame.timestamp):
+                        x1, y1, x2, y2 = box.xyxy[0].tolist()
+                        data = {
+                            "plate": plate,
+                            "model": model_name,
+                            "cv_label": illegal_labels[class_id],
+                            "source": "interior"
+                        }
+                        # Sent without an image if the encoder is backed up, never lost
+                        if not evidence.submit(frame.image, data,
+                                               box=(x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y)):
+                            stats.drop("evidence")
+                        ring.clip(illegal_labels[class_id], at=frame.captured_at)
+        if show:
+            results_slot.put(results[-1])
+        if debug:
+            debug.publish(results[-1])
+    results_slot.close()
+    running.clear()
+
+workers = [threading.Thread(target=capture_loop, daemon=True),
+           threading.Thread(target=inference_loop, daemon=True)]
+for worker in workers:
+    worker.start()
+
+# Main loop: render the newest result (OpenCV windows want the main thread),
+# or when headless just report until Ctrl+C
+last_report = time.monotonic()
+rendered = 0
+try:
+    while running.is_set():
+        if show:
+            r = results_slot.get(timeout=0.5)
+            if r is not None:
+                start = time.monotonic()
+                frame_with_boxes = r.plot()
+                cv2.imshow("YOLO Detection", frame_with_boxes)
+                stats.observe("render", time.monotonic() - start)
+                if results_slot.overwritten > rendered:
+                    stats.drop("render", results_slot.overwritten - rendered)
+                    rendered = results_slot.overwritten
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                running.clear()
+        else:
+            time.sleep(0.5)
+
+        if time.monotonic() - last_report >= stats_interval:
+            print(f"📊 Pipeline over the last {stats_interval}s (inference up to {controller.rate:.1f}/s):\n"
+                  f"{stats.summary()}\n🎞️ Ring: {ring.status()}")
+            last_report = time.monotonic()
+except KeyboardInterrupt:
+    running.clear()
+
+for worker in workers:
+    worker.join(timeout=2)
+evidence.close()
+ring.close()
+source.release()
+if log:
+    log.close()
+if debug:
+    debug.close()
+if show:
+    cv2.destroyAllWindows()
@@ -0,0 +1,261 @@
+# Synthetic fleet load generator for server.py, entirely on localhost.
+#
+# Simulates N vehicles posting the same payloads as imu.py, outer.py,
+# inner.py (with base64 images), bio.py and exterior.py at their real rates,
+# while app clients poll /data and /history like home_screen.dart. Prints
+# throughput, p50/p95/p99 latency per route and the server's RSS over time.
+#
+# Usage: python loadgen.py --vehicles 100 --apps 20 --seconds 60
+#        python loadgen.py --shards 4   (through shard_router.py)
+#        python loadgen.py --url http://127.0.0.1:5000 --server-pid 1234
+import argparse
+import base64
+import heapq
+import http.client
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+from trigger_format import PLATE_HEADER, encode_plate
+from util import free_port, percentile, wait_until_up, HERE
+
+INTERIOR_LABELS = ["drinking", "eating", "mobile use", "sleep", "smoking"]
+EXTERIOR_LABELS = ["COLLISION WARNING", "WRONG WAY DRIVING", "LANE DEPARTURE", "MULTIPLE HAZARDS"]
+VD_LABELS = ["aggressive", "keen", "normal", "smooth"]
+
+
+# ---------- Edge payloads ----------
+def imu_payload(vehicle, rng, images):
+    return {"plate": vehicle["plate"], "model": vehicle["model"],
+            "actual_speed": round(rng.uniform(0, 120), 2), "vd_label": rng.choice(VD_LABELS)}
+
+
+def outer_payload(vehicle, rng, images):
+    return {"plate": vehicle["plate"], "model": vehicle["model"],
+            "actual_speed": 22.5, "target_speed": float(rng.choice([40, 60, 80, 100, 120]))}
+
+
+def inner_payload(vehicle, rng, images):
+    return {"plate": vehicle["plate"], "model": vehicle["model"], "cv_label": rng.choice(INTERIOR_LABELS),
+            "cv_image": rng.choice(images), "source": "interior"}
+
+
+def bio_payload(vehicle, rng, images):
+    return {"plate": vehicle["plate"], "model": vehicle["model"], "cv_label": "none", "cv_image": "",
+            "vd_label": "normal",
+            "bio": {"heart_rate": round(rng.uniform(55, 110), 2), "oxygen": round(rng.uniform(92, 99), 2),
+                    "respiration_rate": rng.randint(10, 20), "temperature": round(rng.uniform(36.2, 37.8), 2),
+                    "alcohol": rng.choice([0.0, 0.0, 0.0, 0.05]),
+                    "blood_pressure": {"systolic": round(rng.uniform(100, 150), 1),
+                                       "diastolic": round(rng.uniform(60, 95), 1)}}}
+
+
+def exterior_payload(vehicle, rng, images):
+    label = rng.choice(EXTERIOR_LABELS)
+    return {"cv_label": label, "cv_image": rng.choice(images), "vd_label": label,
+            "plate": vehicle["plate"], "model": vehicle["model"], "source": "exterior"}
+
+
+# name: (seconds between sends, chance that a send actually happens, payload)
+# inner/outer/exterior only send when something is detected
+EDGE_STREAMS = {
+    "imu": (5, 1.0, imu_payload),
+    "outer": (10, 0.3, outer_payload),
+    "inner": (10, 0.2, inner_payload),
+    "bio": (32, 1.0, bio_payload),
+    "exterior": (10, 0.1, exterior_payload),
+}
+APP_POLL_INTERVAL = 10
+
+
+def fake_images(count, size_kb, rng):
+    # JPEG-looking blobs of the size a 640x480 dashcam frame encodes to
+    images = []
+    for _ in range(count):
+        raw = b"\xff\xd8\xff\xe0" + bytes(rng.getrandbits(8) for _ in range(size_kb * 1024)) + b"\xff\xd9"
+        images.append(base64.b64encode(raw).decode())
+    return images
+
+
+def read_rss_mb(pid):
+    # Includes child processes, so a sharded server counts all of its shards
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, StopIteration):
+        return None
+    return rss + sum(read_rss_mb(child) or 0 for child in children)
+
+
+# ---------- Load generation ----------
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record(self, route, latency, ok, sent, received):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(latency)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def count(self, route):
+        with self.lock:
+            return len(self.latencies.get(route, ()))
+
+
+def worker(host, port, jobs, stats):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        route, method, path, body, headers = job
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            received = len(response.read())
+            ok = response.status < 400 or (route != "/trigger" and response.status == 404)
+        except (OSError, http.client.HTTPException):
+            ok, received = False, 0
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        stats.record(route, time.perf_counter() - start, ok, len(body or b""), received)
+
+
+def run(host, port, args, server_pid):
+    rng = random.Random(args.seed)
+    images = fake_images(args.image_pool, args.image_kb, rng)
+    vehicles = [{"plate": f"SIM{n:04d}", "model": "Toyota Corolla"} for n in range(args.vehicles)]
+
+    # (due time, tie breaker, kind, index) — first sends are spread over one period
+    schedule = []
+    counter = 0
+    for index in range(len(vehicles)):
+        for name, (period, _, _) in EDGE_STREAMS.items():
+            heapq.heappush(schedule, (rng.uniform(0, period) / args.speedup, counter, name, index))
+            counter += 1
+    for index in range(args.apps):
+        heapq.heappush(schedule, (rng.uniform(0, APP_POLL_INTERVAL) / args.speedup, counter, "app", index))
+        counter += 1
+
+    jobs = queue.Queue()
+    stats = Stats()
+    threads = [threading.Thread(target=worker, args=(host, port, jobs, stats), daemon=True)
+               for _ in range(args.connections)]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    next_report = args.report_every
+    rss_start = read_rss_mb(server_pid) if server_pid else None
+    print(f"🚗 {args.vehicles} vehicles, {args.apps} app clients, {args.seconds:.0f}s at {args.speedup:g}x speed")
+    while True:
+        now = time.perf_counter() - start
+        if now >= args.seconds:
+            break
+        if now >= next_report:
+            rss = read_rss_mb(server_pid) if server_pid else None
+            rss_text = f" | server RSS {rss:.1f} MB" if rss is not None else ""
+            print(f"⏱️ {now:5.0f}s | {stats.count('/trigger')} events ingested | queue {jobs.qsize()}{rss_text}")
+            next_report += args.report_every
+        due, _, kind, index = schedule[0]
+        if due > now:
+            time.sleep(min(due - now, 0.05))
+            continue
+        heapq.heappop(schedule)
+
+        if kind == "app":
+            plate = vehicles[rng.randrange(len(vehicles))]["plate"]
+            jobs.put(("/data/<plate>", "GET", f"/data/{plate}", None, {}))
+            jobs.put(("/history/<plate>", "GET", f"/history/{plate}", None, {}))
+            period = APP_POLL_INTERVAL
+        else:
+            period, chance, make_payload = EDGE_STREAMS[kind]
+            if rng.random() < chance:
+                body = json.dumps(make_payload(vehicles[index], rng, images)).encode()
+                # The plate header the uplink sends, so a shard router needn't parse the body
+                headers = {"Content-Type": "application/json",
+                           PLATE_HEADER: encode_plate(vehicles[index]["plate"])}
+                jobs.put(("/trigger", "POST", "/trigger", body, headers))
+        heapq.heappush(schedule, (due + period / args.speedup, counter, kind, index))
+        counter += 1
+
+    for _ in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n📊 Results after {elapsed:.1f}s")
+    for route in ("/trigger", "/data/<plate>", "/history/<plate>"):
+        latencies = sorted(stats.latencies.get(route, []))
+        print(f"{route:>17} | {len(latencies) / elapsed:7.1f} req/s | p50 {percentile(latencies, 50) * 1000:7.1f} ms"
+              f" | p95 {percentile(latencies, 95) * 1000:7.1f} ms | p99 {percentile(latencies, 99) * 1000:7.1f} ms"
+              f" | errors {stats.errors.get(route, 0)}")
+    print(f"📤 {stats.bytes_sent / 1e6:.1f} MB sent, 📥 {stats.bytes_received / 1e6:.1f} MB received")
+    if server_pid:
+        rss = read_rss_mb(server_pid)
+        if rss is not None and rss_start is not None:
+            print(f"🧠 Server RSS {rss_start:.1f} MB -> {rss:.1f} MB ({rss - rss_start:+.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vehicles", type=int, default=100)
+    parser.add_argument("--apps", type=int, default=20, help="app clients polling /data and /history")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--speedup", type=float, default=1.0, help="divide every send interval by this")
+    parser.add_argument("--connections", type=int, default=16, help="keep-alive client connections")
+    parser.add_argument("--image-kb", type=int, default=40)
+    parser.add_argument("--image-pool", type=int, default=20, help="distinct images to pick from")
+    parser.add_argument("--report-every", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="use an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="pid of --url server, for RSS sampling")
+    parser.add_argument("--mode", default="gevent", help="server mode when starting one")
+    parser.add_argument("--shards", type=int, default=0, help="start shard_router.py with this many shards instead")
+    parser.add_argument("--routers", type=int, default=1, help="router processes with --shards")
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlparse(args.url)
+        run(url.hostname, url.port or 80, args, args.server_pid)
+        return
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as folder:
+        env = dict(os.environ, FLEET_DB=os.path.join(folder, "fleet.db"), IMAGE_DIR=os.path.join(folder, "images"))
+        if args.shards:
+            command = [os.path.join(HERE, "shard_router.py"), "--shards", str(args.shards),
+                       "--routers", str(args.routers)]
+        else:
+            command = [os.path.join(HERE, "server.py"), "--mode", args.mode]
+        server = subprocess.Popen(
+            [sys.executable, *command, "--host", "127.0.0.1", "--port", str(port)],
+            cwd=folder, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port, timeout=60)
+            run("127.0.0.1", port, args, server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Deciding which cabin frames are worth a YOLO inference (inner.py).
+#
+# MotionGate scores how much a frame differs from the last one that was
+# inferred, on a blurred 64x48 greyscale copy, which costs well under a
+# millisecond. RateController turns that into a yes/no per frame: frames
+# with motion are inferred as often as the CPU (and optionally latency)
+# budget allows, and a still cabin is still inferred at min_rate, because
+# a driver falling asleep is exactly the case where nothing moves.
+import cv2
+
+GATE_SIZE = (64, 48)
+PIXEL_DELTA = 25         # grey levels a pixel must change by to count as moved
+MOTION_THRESHOLD = 0.01  # fraction of moved pixels that counts as motion
+
+
+class MotionGate:
+    def __init__(self, threshold=MOTION_THRESHOLD, size=GATE_SIZE):
+        self.threshold = threshold
+        self.size = size
+        self._reference = None  # small copy of the last inferred frame
+        self._current = None
+
+    def score(self, image):
+        """Fraction of pixels that changed since the last mark(); 1.0 before the first."""
+        small = cv2.GaussianBlur(cv2.cvtColor(cv2.resize(image, self.size, interpolation=cv2.INTER_AREA),
+                                              cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        self._current = small
+        if self._reference is None:
+            return 1.0
+        return float((cv2.absdiff(small, self._reference) > PIXEL_DELTA).mean())
+
+    def moved(self, image):
+        return self.score(image) >= self.threshold
+
+    def mark(self):
+        """The frame last scored was inferred: later frames are compared to it."""
+        self._reference = self._current
+
+
+class RateController:
+    """Spacing between inferences that keeps YOLO within a share of one CPU
+    core (cpu_budget) and, if given, capture-to-detection latency within
+    latency_budget seconds, but never lets it fall below min_rate per second."""
+
+    def __init__(self, cpu_budget=0.5, min_rate=1.0, max_rate=15.0, latency_budget=None):
+        self.cpu_budget = cpu_budget
+        self.longest = 1 / min_rate
+        self.shortest = 1 / max_rate
+        self.latency_budget = latency_budget
+        self.interval = self.shortest
+        self._cost = None  # smoothed seconds per inference
+        self._backoff = 1.0
+        self._last = None
+
+    @property
+    def rate(self):
+        return 1 / self.interval
+
+    def due(self, now, moved):
+        """Whether the frame at now should be inferred."""
+        if self._last is None:
+            return True
+        since = now - self._last
+        return since >= self.longest or (moved and since >= self.interval)
+
+    def observe(self, now, seconds, latency=None):
+        """Record an inference that started at now and took seconds."""
+        self._last = now
+        self._cost = seconds if self._cost is None else 0.8 * self._cost + 0.2 * seconds
+        if self.latency_budget is not None and latency is not None:
+            # Back off quickly when over the latency budget, creep back when under
+            if latency > self.latency_budget:
+                self._backoff = min(self._backoff * 1.25, self.longest / self.shortest)
+            else:
+                self._backoff = max(1.0, self._backoff * 0.95)
+        interval = self._cost / self.cpu_budget * self._backoff
+        self.interval = min(max(interval, self.shortest), self.longest)
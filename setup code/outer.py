@@ -1,11 +1,14 @@
 import cv2
-from ultralytics import YOLO
-import requests
 #import base64
-import threading
 import time
 import re
 
+from debug_stream import DebugStream, show_window, DEBUG_MAX_FPS
+from detector_backend import load_detector
+from frame_source import open_source, IMAGE_FPS
+from results_log import ResultsLog
+from uplink import Uplink, PRIORITY_LOW
+
 # Load configuration from config.txt
 def load_config(path='config.txt'):
     config = {}
@@ -20,22 +23,31 @@ config = load_config()
 plate = config.get("plate", "UNKNOWN")
 model_name = config.get("model", "UNKNOWN")
 server_ip = config.get("server_ip", "127.0.0.1")
-server_url = f"http://{server_ip}:5000/trigger"
+uplink = Uplink(server_ip, spool_path="outer-spool.db")
+
+# Load YOLO model (your traffic sign detector) on the configured backend
+model = load_detector("traffic_sign_detector.pt", backend=config.get("backend", "pytorch"),
+                      int8=config.get("int8") == "1", calibration=config.get("calibration"))
 
-# Load YOLO model (your traffic sign detector)
-model = YOLO("traffic_sign_detector.pt")
+# A local window only with a display attached (or headless=0); debug_port=<port>
+# adds an MJPEG view that only renders while someone is watching it
+show = show_window(config)
+debug = DebugStream(config.get("debug_host", "127.0.0.1"), int(config["debug_port"]),
+                    float(config.get("debug_fps", DEBUG_MAX_FPS))) if config.get("debug_port") else None
 
-# Open camera
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+# Camera by default; source=<video file or image folder> replays it instead,
+# replay=realtime or fast (every frame, as quickly as they are processed)
+source = open_source(config.get("source", "0"), config.get("replay", "realtime"),
+                     float(config.get("replay_fps", IMAGE_FPS)))
 
-# Send data to server
+# results_log=<file> records every inferred frame, for benchmarks and regression runs
+log = ResultsLog(config["results_log"]) if config.get("results_log") else None
+
+# Queue data for the server; the uplink worker sends it in the background
 def send_data(data):
-    try:
-        response = requests.post(server_url, json=data)
-        print(f"✅ Sent speed data to {server_url}: {response.status_code} - {response.text}")
-    except Exception as e:
-        print("❌ Error:", e)
+    # A newer reading replaces one still waiting to go out
+    uplink.send(data, priority=PRIORITY_LOW, coalesce_key="speed")
+    print(f"📤 Queued speed data for {uplink.url} ({uplink.pending()} waiting)")
 
 # Utility to extract speed from label
 def extract_speed(label):
@@ -45,22 +57,27 @@ def extract_speed(label):
 # Frame loop
 frame_skip = 1
 frame_count = 0
-last_sent_time = 0
-send_interval = 10  # seconds
+last_sent_time = None
+send_interval = 10  # seconds, on the source's clock
 
 while True:
-    ret, frame = cap.read()
+    ret, frame = source.read()
     if not ret:
         break
+    captured_at = time.monotonic()
 
     frame_count += 1
     if frame_count % frame_skip != 0:
         continue
 
     resized_frame = cv2.resize(frame, (640, 480))
+    start = time.monotonic()
     results = model(resized_frame)
+    done = time.monotonic()
+    if log:
+        log.write(frame_count - 1, source.timestamp, results, done - start, done - captured_at)
 
-    current_time = time.time()
+    current_time = source.timestamp
     target_speed = 0.0
 
     for r in results:
@@ -76,7 +93,7 @@ while True:
                     target_speed = extract_speed(label)
 
     # If any speed limit detected and enough time passed
-    if target_speed > 0 and (current_time - last_sent_time >= send_interval):
+    if target_speed > 0 and (last_sent_time is None or current_time - last_sent_time >= send_interval):
         # 👇 Replace this with actual IMU integration result
         actual_speed = 22.5  # ← replace with your own IMU-derived value
 
@@ -87,15 +104,24 @@ while True:
             "target_speed": target_speed
         }
 
-        threading.Thread(target=send_data, args=(data,)).start()
+        send_data(data)
         last_sent_time = current_time
 
-    # Show frame with annotations
-    frame_with_boxes = r.plot()
-    cv2.imshow("Speed Limit Detection", frame_with_boxes)
+    if debug:
+        debug.publish(r)
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+    # Show frame with annotations
+    if show:
+        frame_with_boxes = r.plot()
+        cv2.imshow("Speed Limit Detection", frame_with_boxes)
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+source.release()
+if log:
+    log.close()
+if debug:
+    debug.close()
+if show:
+    cv2.destroyAllWindows()
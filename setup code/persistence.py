@@ -0,0 +1,294 @@
+import atexit
+import copy
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from bio_rollups import BioRollups, reading_time
+from fleet_state import new_latest, apply_event
+from history_store import apply_delta
+
+# SQLite file holding the event log and the per-plate snapshots
+FLEET_DB = os.environ.get("FLEET_DB", "fleet.db")
+
+# A failed commit (e.g. "database is locked") is retried with a doubling
+# delay; while closing it is given up after a few attempts
+WRITE_RETRY_DELAY = 0.5
+WRITE_RETRY_MAX_DELAY = 30.0
+WRITE_CLOSE_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    plate TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    received_at REAL NOT NULL,
+    entry TEXT NOT NULL,
+    keyframe INTEGER NOT NULL DEFAULT 1,
+    state TEXT,
+    PRIMARY KEY (plate, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    plate TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    latest TEXT NOT NULL,
+    last_seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    plate TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (plate, metric, resolution, start)
+) WITHOUT ROWID;
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # One fsync per committed batch, not per event
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(SCHEMA)
+    # Databases from before delta encoding only hold full entries (keyframes)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(events)")]
+    if "keyframe" not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN keyframe INTEGER NOT NULL DEFAULT 1")
+    # Keyframes written before this hold no vehicle state (NULL)
+    if "state" not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN state TEXT")
+    return conn
+
+
+def decode_rows(rows):
+    # (seq, received_at, keyframe, entry, state) rows in seq order, starting
+    # at a keyframe -> (seq, received_at, full entry, state after it if the
+    # row is a keyframe that has one, else None)
+    entry = None
+    for seq, received_at, keyframe, text, state in rows:
+        if keyframe:
+            entry = json.loads(text)
+        elif entry is not None:
+            delta = json.loads(text)
+            entry = apply_delta(entry, (delta["set"], delta["unset"]))
+        else:
+            continue
+        yield seq, received_at, entry, json.loads(state) if state else None
+
+
+class Persistence:
+    """Durable event log for fleet_data.
+
+    record() only queues the event; a single writer thread commits whatever
+    is queued in one transaction (group commit), and every snapshot_interval
+    seconds also writes the latest state and bio rollup buckets of the plates
+    that changed, so a restart only has to replay the events after each
+    plate's snapshot. Events are stored the way HistoryStore keeps them:
+    keyframes hold the full entry, the rows in between only the delta.
+    A batch that fails to commit is logged and retried, the writer never
+    stops over one.
+    """
+
+    def __init__(self, path=FLEET_DB, batch_size=500, flush_interval=0.05, snapshot_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+
+        self._queue = queue.Queue()
+        self._conn = connect(path)
+        self._state = {}    # plate -> [model, latest, last_seq, rollups] as persisted so far
+        self._dirty = set()
+        self._unsaved_rollups = []  # rollup rows popped for a snapshot that failed
+        self._last_snapshot = time.monotonic()
+        self._writer = None
+        self._closing = False
+
+    # ---------- RECOVERY ----------
+    def load(self, history_limit):
+        """Rebuild {plate: {"model", "latest", "rollups", "entries", "first_seq",
+        "history_state"}} from disk.
+
+        Latest state comes from each plate's snapshot plus the events logged
+        after it; only the newest history_limit events per plate are read.
+        history_state is the vehicle's state just before the first entry,
+        from the last keyframe before it (None if that keyframe has none).
+        """
+        fleet = {}
+        for plate, model, latest, last_seq in self._conn.execute(
+                "SELECT plate, model, latest, last_seq FROM snapshots"):
+            fleet[plate] = {"model": model, "latest": json.loads(latest), "last_seq": last_seq,
+                            "rollups": BioRollups()}
+
+        rollup_rows = {}
+        for row in self._conn.execute(
+                "SELECT plate, metric, resolution, start, min, max, sum, count FROM rollups ORDER BY start"):
+            rollup_rows.setdefault(row[0], []).append(row[1:])
+
+        for (plate,) in self._conn.execute("SELECT DISTINCT plate FROM events").fetchall():
+            vehicle = fleet.setdefault(plate, {"model": "Unknown", "latest": new_latest(), "last_seq": -1,
+                                               "rollups": BioRollups()})
+            vehicle["rollups"].restore(rollup_rows.pop(plate, []))
+
+            # Decode from the keyframe before whichever comes first: the
+            # oldest history entry to restore or the first event after the
+            # snapshot
+            (max_seq,) = self._conn.execute("SELECT MAX(seq) FROM events WHERE plate = ?", (plate,)).fetchone()
+            history_start = max(max_seq - history_limit + 1, 0)
+            begin = min(history_start, vehicle["last_seq"] + 1)
+            (keyframe_seq,) = self._conn.execute(
+                "SELECT MAX(seq) FROM events WHERE plate = ? AND keyframe = 1 AND seq <= ?",
+                (plate, begin)).fetchone()
+            rows = self._conn.execute(
+                "SELECT seq, received_at, keyframe, entry, state FROM events WHERE plate = ? AND seq >= ?"
+                " ORDER BY seq", (plate, keyframe_seq if keyframe_seq is not None else 0))
+
+            entries = []
+            history_state = None
+            for seq, received_at, data, state in decode_rows(rows):
+                if seq > vehicle["last_seq"]:
+                    if vehicle["model"] == "Unknown" and "model" in data:
+                        vehicle["model"] = data["model"]
+                    apply_event(vehicle["latest"], data)
+                    if "bio" in data:
+                        vehicle["rollups"].add(reading_time(received_at, data), data["bio"])
+                if seq >= history_start:
+                    if not entries:
+                        vehicle["first_seq"] = seq
+                    entries.append(data)
+                elif state is not None:
+                    history_state = state
+                elif history_state is not None:
+                    apply_event(history_state, data)
+            vehicle["entries"] = entries
+            vehicle["history_state"] = history_state
+            vehicle["last_seq"] = max(max_seq, vehicle["last_seq"])
+
+        for plate, vehicle in fleet.items():
+            vehicle.setdefault("entries", [])
+            vehicle.setdefault("first_seq", vehicle["last_seq"] + 1)
+            vehicle.setdefault("history_state", None)
+            vehicle["rollups"].restore(rollup_rows.pop(plate, []))
+            # The writer keeps its own copies, the caller's are mutated live
+            rollups = copy.deepcopy(vehicle["rollups"])
+            rollups.track_dirty = True
+            self._state[plate] = [vehicle["model"], copy.deepcopy(vehicle["latest"]), vehicle["last_seq"], rollups]
+        return fleet
+
+    # ---------- WRITES ----------
+    def start(self):
+        self._writer = threading.Thread(target=self._run, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, plate, model, seq, received_at, entry, delta=None, state=None):
+        # delta is what HistoryStore.append() returned: None for a keyframe,
+        # which also stores state, the vehicle's latest state after it
+        self._queue.put((plate, model, seq, received_at, entry, delta, state))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until everything recorded so far is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        self._closing = True
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+            self._retry("snapshots", self._write_snapshots)
+        self._conn.close()
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            events = [item for item in batch if isinstance(item, tuple)]
+            if events:
+                self._retry(f"{len(events)} events", self._write, events)
+                if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+                    self._retry("snapshots", self._write_snapshots)
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    self._retry("snapshots", self._write_snapshots)
+                    item.set()
+
+    def _retry(self, what, write, *args):
+        # Keep trying a failed commit; the queue grows meanwhile and shows up
+        # as fleet_persistence_queue. Anything but a database error won't
+        # get better by retrying, so that batch is dropped.
+        delay = WRITE_RETRY_DELAY
+        attempts = 0
+        while True:
+            try:
+                write(*args)
+                return True
+            except sqlite3.Error as e:
+                attempts += 1
+                if self._closing and attempts >= WRITE_CLOSE_ATTEMPTS:
+                    print(f"⚠️ Persistence gave up writing {what} while closing: {e!r}")
+                    return False
+                print(f"⚠️ Persistence couldn't write {what}, retrying in {delay:g}s: {e!r}")
+                time.sleep(delay)
+                delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+            except Exception as e:
+                print(f"⚠️ Persistence dropped {what}: {e!r}")
+                return False
+
+    def _write(self, events):
+        rows = []
+        for plate, model, seq, received_at, entry, delta, state in events:
+            if delta is None:
+                rows.append((plate, seq, received_at, json.dumps(entry), 1,
+                             json.dumps(state) if state is not None else None))
+            else:
+                rows.append((plate, seq, received_at, json.dumps({"set": delta[0], "unset": delta[1]}), 0, None))
+
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        # Only once committed, so a batch that is retried isn't applied twice
+        for plate, model, seq, received_at, entry, delta, _ in events:
+            state = self._state.setdefault(plate, [model, new_latest(), -1, BioRollups(track_dirty=True)])
+            apply_event(state[1], entry)
+            state[2] = seq
+            if "bio" in entry:
+                state[3].add(reading_time(received_at, entry), entry["bio"])
+            self._dirty.add(plate)
+
+    def _write_snapshots(self):
+        if self._dirty:
+            rows = []
+            for plate in self._dirty:
+                model, latest, last_seq, rollups = self._state[plate]
+                rows.append((plate, model, json.dumps(latest), last_seq))
+                self._unsaved_rollups.extend((plate, *row) for row in rollups.pop_dirty())
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", rows)
+                self._conn.executemany("INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       self._unsaved_rollups)
+            self._dirty.clear()
+            self._unsaved_rollups = []
+        self._last_snapshot = time.monotonic()
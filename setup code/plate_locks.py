@@ -0,0 +1,17 @@
+import threading
+import zlib
+
+# Number of locks shared by all plates; more stripes means fewer collisions
+LOCK_STRIPES = 64
+
+
+class PlateLocks:
+    """Lock striping for fleet_data: each plate maps to one of a fixed set
+    of locks, so two vehicles only contend when they share a stripe and the
+    lock table never grows with the fleet."""
+
+    def __init__(self, stripes=LOCK_STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, plate):
+        return self._locks[zlib.crc32(plate.encode()) % len(self._locks)]
@@ -0,0 +1,67 @@
+# Per-frame detection log for benchmark and regression runs of the CV
+# scripts (results_log= in config.txt).
+#
+# One JSON line per inferred frame: its index and source timestamp, how
+# long inference took, capture-to-result latency and the boxes found. On
+# close a final {"summary": ...} line adds up frames, FPS, latency
+# percentiles and detections per label, so two runs over the same replay
+# source can be compared line by line or just by their summaries.
+import json
+import threading
+import time
+
+from util import percentile
+
+
+class ResultsLog:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._inference = []
+        self._latency = []
+        self._counts = {}
+
+    def write(self, index, timestamp, results, inference, latency):
+        """Log one inferred frame; results are the model's Results list."""
+        detections = []
+        for r in results:
+            if r.boxes is None:
+                continue
+            for cls, conf, box in zip(r.boxes.cls.tolist(), r.boxes.conf.tolist(), r.boxes.xyxy.tolist()):
+                detections.append({"label": r.names[int(cls)], "conf": round(conf, 3),
+                                   "box": [round(v, 1) for v in box]})
+        line = json.dumps({"frame": index, "t": round(timestamp, 3), "inference_ms": round(inference * 1000, 1),
+                           "latency_ms": round(latency * 1000, 1), "detections": detections})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._inference.append(inference)
+            self._latency.append(latency)
+            for detection in detections:
+                self._counts[detection["label"]] = self._counts.get(detection["label"], 0) + 1
+
+    def summary(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            inference = sorted(self._inference)
+            latency = sorted(self._latency)
+            return {
+                "frames": len(inference),
+                "seconds": round(elapsed, 2),
+                "fps": round(len(inference) / elapsed, 2) if elapsed else 0.0,
+                "inference_ms": {"p50": round(percentile(inference, 50) * 1000, 1),
+                                 "p95": round(percentile(inference, 95) * 1000, 1)},
+                "latency_ms": {"p50": round(percentile(latency, 50) * 1000, 1),
+                               "p95": round(percentile(latency, 95) * 1000, 1)},
+                "detections": dict(sorted(self._counts.items())),
+            }
+
+    def close(self):
+        summary = self.summary()
+        with self._lock:
+            self._file.write(json.dumps({"summary": summary}) + "\n")
+            self._file.close()
+        print(f"🧾 {summary['frames']} frames at {summary['fps']} FPS, latency p50 {summary['latency_ms']['p50']} ms,"
+              f" detections {summary['detections']} -> {self.path}")
+        return summary
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+from bio_rollups import RETENTION
+from blob_store import DIGEST_RE
+from persistence import connect
+
+# How long each class of data is kept, in seconds. Evidence images are only
+# needed for days and raw events (including raw bio readings) for weeks;
+# bio rollups follow bio_rollups.RETENTION, up to months at 1h resolution.
+RETENTION_POLICY = {
+    "images": float(os.environ.get("IMAGE_RETENTION_DAYS", "7")) * 24 * 3600,
+    "events": float(os.environ.get("EVENT_RETENTION_DAYS", "30")) * 24 * 3600,
+}
+
+# Seconds between compaction passes
+COMPACT_INTERVAL = float(os.environ.get("COMPACT_INTERVAL", "600"))
+
+
+class Compactor:
+    """Background job that deletes data older than RETENTION_POLICY.
+
+    A pass walks one plate (or one image folder) at a time and never deletes
+    more than slice_rows database rows per transaction, sleeping ``pause``
+    seconds between slices, so plate locks and the SQLite write lock are
+    only ever held briefly and ingest keeps flowing while it runs.
+
+    Event rows are only deleted up to a keyframe that stays, and never past
+    a plate's snapshot, so both history decoding and recovery keep working.
+    Images still shown as a vehicle's latest are kept whatever their age.
+    """
+
+    def __init__(self, db_path, fleet_data, plate_lock, images, policy=RETENTION_POLICY,
+                 interval=COMPACT_INTERVAL, slice_rows=500, pause=0.02, reclaimed=None):
+        self.fleet_data = fleet_data
+        self.plate_lock = plate_lock
+        self.images = images
+        self.policy = policy
+        self.interval = interval
+        self.slice_rows = slice_rows
+        self.pause = pause
+        self.reclaimed = reclaimed  # optional metrics Counter labelled by data class
+        self._conn = connect(db_path)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            # A failed pass is logged and the next one runs on schedule; the
+            # thread must outlive any one bad row or locked database
+            try:
+                report = self.run_once()
+            except Exception as e:
+                print(f"⚠️ Compaction pass failed: {e!r}")
+            else:
+                if any(amount for name, amount in report.items() if name != "seconds"):
+                    print(f"🧹 Compaction reclaimed {report['events']} events, {report['history_entries']} history"
+                          f" entries, {report['rollup_buckets']} rollup buckets and {report['images']} images"
+                          f" ({report['image_bytes'] / 1e6:.1f} MB) in {report['seconds']:.1f}s")
+            time.sleep(self.interval)
+
+    def run_once(self, now=None):
+        """One full pass over every data class, returns what was reclaimed."""
+        now = time.time() if now is None else now
+        start = time.monotonic()
+        report = {"events": 0, "history_entries": 0, "rollup_buckets": 0, "images": 0, "image_bytes": 0}
+        for plate in list(self.fleet_data):
+            # One plate that can't be compacted doesn't hold back the others
+            try:
+                self._compact_plate(plate, now, report)
+            except Exception as e:
+                print(f"⚠️ Compaction skipped {plate}: {e!r}")
+        self._compact_images(now, report)
+
+        if self.reclaimed is not None:
+            for name, amount in report.items():
+                if amount:
+                    self.reclaimed.inc(name, amount=amount)
+        report["seconds"] = time.monotonic() - start
+        return report
+
+    def _compact_plate(self, plate, now, report):
+        vehicle = self.fleet_data[plate]
+        with self.plate_lock(plate):
+            report["rollup_buckets"] += vehicle["rollups"].expire(now)
+            if self.policy["events"]:
+                report["history_entries"] += vehicle["history"].expire(now - self.policy["events"])
+        time.sleep(self.pause)
+
+        rows = 0
+        with self._conn:
+            for resolution, keep in RETENTION.items():
+                rows += self._conn.execute(
+                    "DELETE FROM rollups WHERE plate = ? AND resolution = ? AND start < ?",
+                    (plate, resolution, now - keep)).rowcount
+        report["rollup_buckets"] += rows
+        time.sleep(self.pause)
+
+        if self.policy["events"]:
+            report["events"] += self._compact_events(plate, now - self.policy["events"])
+
+    def _compact_events(self, plate, before):
+        snapshot = self._conn.execute("SELECT last_seq FROM snapshots WHERE plate = ?", (plate,)).fetchone()
+        if snapshot is None:
+            return 0
+        # First row that has to stay: the oldest one still in retention, or
+        # the first one recovery would replay after the snapshot
+        (first_kept,) = self._conn.execute(
+            "SELECT MIN(seq) FROM events WHERE plate = ? AND received_at >= ?", (plate, before)).fetchone()
+        first_needed = snapshot[0] + 1 if first_kept is None else min(first_kept, snapshot[0] + 1)
+        (cut,) = self._conn.execute(
+            "SELECT MAX(seq) FROM events WHERE plate = ? AND keyframe = 1 AND seq <= ?",
+            (plate, first_needed)).fetchone()
+        (lowest,) = self._conn.execute("SELECT MIN(seq) FROM events WHERE plate = ?", (plate,)).fetchone()
+        if cut is None or lowest is None:
+            return 0
+
+        deleted = 0
+        for low in range(lowest, cut, self.slice_rows):
+            with self._conn:
+                deleted += self._conn.execute(
+                    "DELETE FROM events WHERE plate = ? AND seq >= ? AND seq < ?",
+                    (plate, low, min(low + self.slice_rows, cut))).rowcount
+            time.sleep(self.pause)
+        return deleted
+
+    def _compact_images(self, now, report):
+        if not self.policy["images"]:
+            return
+        before = now - self.policy["images"]
+        in_use = set()
+        for vehicle in list(self.fleet_data.values()):
+            latest = vehicle["latest"]
+            in_use.add(latest.get("interior", {}).get("cv_image_id", ""))
+            in_use.add(latest.get("exterior", {}).get("exterior_image_id", ""))
+
+        # One two-character shard folder per slice
+        for folder in sorted(os.listdir(self.images.root)):
+            try:
+                names = os.listdir(os.path.join(self.images.root, folder))
+            except NotADirectoryError:
+                continue
+            for name in names:
+                if name in in_use or not DIGEST_RE.match(name):
+                    continue
+                freed = self.images.remove_if_older(name, before)
+                if freed:
+                    report["images"] += 1
+                    report["image_bytes"] += freed
+            time.sleep(self.pause)
@@ -1,103 +1,439 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, abort, g
 from flask_cors import CORS
 from datetime import datetime
+import argparse
+import json
+import socket
+import time
+import uuid
+import zlib
+
+from bio_rollups import BioRollups, BIO_METRICS, RESOLUTIONS, reading_time
+from blob_store import BlobStore, guess_mimetype
+from fleet_state import new_latest, apply_event
+from fleet_summary import FleetSummary
+from history_store import HistoryStore, HISTORY_MAX_ENTRIES
+from metrics import Registry, Counter, Histogram, Gauge, LATENCY_BUCKETS, SIZE_BUCKETS
+from persistence import Persistence
+from plate_locks import PlateLocks
+from retention import Compactor
+from stream_hub import StreamHub, STREAM_HEARTBEAT
+from trigger_format import decode_batch, parse_batch
+
+# Optional speedups: orjson encodes several times faster than json, brotli
+# compresses history tighter than gzip for clients that accept it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
 
-fleet_data = {}
+images = BlobStore()
+streams = StreamHub()
 
-@app.route('/trigger', methods=['POST'])
-def trigger():
-    data = request.get_json()
-    plate = data.get("plate")
-    if not plate:
-        return jsonify({"status": "error", "message": "No plate provided"}), 400
+# Part of every ETag so versions from an earlier run never look current
+BOOT_ID = uuid.uuid4().hex[:8]
+
+# ---------- Recover from disk ----------
+store = Persistence()
+fleet_data = {
+    plate: {
+        "model": vehicle["model"],
+        "history": HistoryStore(entries=vehicle["entries"], first_seq=vehicle["first_seq"],
+                                state=vehicle["history_state"]),
+        "latest": vehicle["latest"],
+        "rollups": vehicle["rollups"],
+        "version": 0
+    }
+    for plate, vehicle in store.load(HISTORY_MAX_ENTRIES).items()
+}
+store.start()
+
+summary = FleetSummary()
+for plate, vehicle in fleet_data.items():
+    summary.update(plate, vehicle["latest"], count_alerts=False)
+
+# Base64 image fields sent by the edge scripts; only their hash is kept
+IMAGE_FIELDS = ("cv_image", "exterior_image")
+
+# History entries encoded per chunk while streaming /history
+HISTORY_CHUNK = 200
+
+# Guards each plate's entry in fleet_data; different vehicles rarely share a
+# stripe, so concurrent requests for them never wait on each other
+plate_lock = PlateLocks()
+
+# ---------- Metrics ----------
+KNOWN_SOURCES = ("interior", "exterior")
 
-    entry_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+registry = Registry()
+request_latency = registry.register(Histogram(
+    "fleet_request_duration_seconds", "Time spent handling a request.", LATENCY_BUCKETS, ("route", "method")))
+request_size = registry.register(Histogram(
+    "fleet_request_size_bytes", "Request body size.", SIZE_BUCKETS, ("route",)))
+response_size = registry.register(Histogram(
+    "fleet_response_size_bytes", "Response body size (/stream excluded).", SIZE_BUCKETS, ("route",)))
+events_total = registry.register(Counter(
+    "fleet_events_total", "Events applied, by source.", ("source",)))
+registry.register(Gauge("fleet_plates", "Vehicles known to the server.", lambda: len(fleet_data)))
+registry.register(Gauge(
+    "fleet_history_entries", "History entries held in memory across all plates.",
+    lambda: sum(len(vehicle["history"]) for vehicle in list(fleet_data.values()))))
+registry.register(Gauge("fleet_images", "Distinct images in the blob store.", lambda: images.count))
+registry.register(Gauge("fleet_image_bytes", "Bytes of images in the blob store.", lambda: images.bytes_held))
+registry.register(Gauge("fleet_stream_subscribers", "Open /stream connections.", streams.count))
+registry.register(Gauge("fleet_persistence_queue", "Events waiting to be committed to disk.", store.pending))
+compaction_reclaimed = registry.register(Counter(
+    "fleet_compaction_reclaimed_total", "Items deleted by retention compaction, by data class.", ("class",)))
 
+# ---------- Retention ----------
+compactor = Compactor(store.path, fleet_data, plate_lock, images, reclaimed=compaction_reclaimed)
+compactor.start()
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    route = request.url_rule.rule if request.url_rule else "other"
+    request_size.observe(request.content_length or 0, route)
+    if response.is_streamed and response.mimetype != "text/event-stream":
+        # Chunked bodies (/history) are measured once the last byte is sent
+        response.response = observed_body(response, route, request.method, g.request_start)
+        return response
+    request_latency.observe(time.perf_counter() - g.request_start, route, request.method)
+    if not response.is_streamed:
+        response_size.observe(response.content_length or 0, route)
+    return response
+
+def observed_body(response, route, method, started):
+    # Counts the bytes of a streamed body; latency and size are recorded
+    # when the server closes the response, even if the client went away
+    sent = [0]
+
+    def count(chunks):
+        for chunk in chunks:
+            sent[0] += len(chunk)
+            yield chunk
+
+    def observe():
+        request_latency.observe(time.perf_counter() - started, route, method)
+        response_size.observe(sent[0], route)
+
+    response.call_on_close(observe)
+    return count(response.response)
+
+def dumps(obj):
+    if orjson:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass  # e.g. integers wider than 64 bits, json copes with those
+    return json.dumps(obj).encode()
+
+def compressed(chunks, encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=4)
+        compress, finish = compressor.process, compressor.finish
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress, finish = compressor.compress, compressor.flush
+    else:
+        yield from chunks
+        return
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+def build_entry(data, received_at):
+    # ---------- IMAGES ----------
+    # Decode once into the blob store, latest/history only keep the hash
+    image_ids = {
+        f"{field}_id": images.put_base64(data[field])
+        for field in IMAGE_FIELDS if field in data
+    }
+
+    return {
+        "source": data.get("source", ""),
+        # include all fields in the snapshot, images by hash only
+        **{key: value for key, value in data.items() if key not in IMAGE_FIELDS},
+        **image_ids,
+        # Set last: history is indexed by the server's clock, whatever the client sent
+        "timestamp": datetime.fromtimestamp(received_at).strftime("%Y-%m-%d %H:%M:%S"),
+        "received_at": received_at,
+    }
+
+def apply_entry(plate, model, entry):
     # Initialize if new plate
     if plate not in fleet_data:
         fleet_data[plate] = {
-            "model": data.get("model", "Unknown"),
-            "history": [],
-            "latest": {
-                "interior": {},
-                "exterior": {},
-                "bio": {},
-                "vd_label": "normal",
-                "speed": {"actual": 0.0, "target": 0.0},
-            }
+            "model": model,
+            "history": HistoryStore(),
+            "latest": new_latest(),
+            "rollups": BioRollups(),
+            "version": 0
         }
 
+    source = entry["source"]
+    events_total.inc(source if source in KNOWN_SOURCES else "other")
+
+    # ---------- Update Latest ----------
     latest = fleet_data[plate]["latest"]
-    source = data.get("source", "")
+    before = dict(latest)
+    apply_event(latest, entry)
 
-    # ---------- INTERIOR ----------
-    if source == "interior":
-        latest["interior"] = {
-            "cv_label": data.get("cv_label", "No detection"),
-            "cv_image": data.get("cv_image", "")
-        }
+    # Push only the top-level fields that changed to /stream subscribers
+    changes = {key: value for key, value in latest.items() if before.get(key) != value}
+    if changes:
+        fleet_data[plate]["version"] += 1
+        streams.publish(plate, changes)
+    # The summary is derived state: a payload it can't make sense of must
+    # not stop the event from being stored
+    try:
+        summary.update(plate, latest, entry)
+    except Exception as e:
+        print(f"⚠️ Fleet summary skipped an event for {plate}: {e!r}")
 
-    # ---------- EXTERIOR ----------
-    elif source == "exterior":
-        cv_label = data.get("cv_label", "")
-        collision_warning = data.get("collision_warning", "")
-        lane_alert = data.get("lane_alert", "")
-
-        warnings = []
-        if cv_label in ["COLLISION WARNING", "WRONG WAY DRIVING", "LANE DEPARTURE", "MULTIPLE HAZARDS"]:
-            warnings.append(cv_label)
-        if collision_warning == "true":
-            warnings.append("COLLISION WARNING")
-        if lane_alert:
-            warnings.append("LANE DEPARTURE")
-
-        latest["exterior"] = {
-            "cv_label": cv_label,
-            "exterior_image": data.get("exterior_image", ""),
-            "collision_warning": collision_warning,
-            "lane_alert": lane_alert,
-            "warnings": list(set(warnings))  # Remove duplicates
-        }
+    # ---------- Save History ----------
+    received_at = entry["received_at"]
+    if "bio" in entry:
+        fleet_data[plate]["rollups"].add(reading_time(received_at, entry), entry["bio"])
+    seq, delta = fleet_data[plate]["history"].append(received_at, entry, latest)
+    store.record(plate, fleet_data[plate]["model"], seq, received_at, entry, delta,
+                 dict(latest) if delta is None else None)
 
-    # ---------- BIOSIGNALS ----------
-    if "bio" in data:
-        latest["bio"] = data["bio"]
+@app.route('/trigger', methods=['POST'])
+def trigger():
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "message": "Invalid event"}), 400
+    plate = data.get("plate")
+    if not plate:
+        return jsonify({"status": "error", "message": "No plate provided"}), 400
+    if not isinstance(plate, str):
+        return jsonify({"status": "error", "message": "Invalid plate"}), 400
 
-    # ---------- VEHICLE DYNAMICS ----------
-    if "vd_label" in data:
-        latest["vd_label"] = data["vd_label"]
+    try:
+        entry = build_entry(data, time.time())
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    with plate_lock(plate):
+        apply_entry(plate, data.get("model", "Unknown"), entry)
 
-    # ---------- SPEED ----------
-    if "actual_speed" in data or "target_speed" in data:
-        latest["speed"] = {
-            "actual": data.get("actual_speed", 0.0),
-            "target": data.get("target_speed", 0.0)
-        }
+    return jsonify({"status": "success"}), 200
 
-    # ---------- Save History ----------
-    entry = {
-        "timestamp": entry_time,
-        "source": source,
-        **data  # include all fields in the snapshot
-    }
-    fleet_data[plate]["history"].append(entry)
+@app.route('/trigger/batch', methods=['POST'])
+def trigger_batch():
+    # Events may carry an edge-side "sent_at" (epoch seconds); each plate's
+    # events are applied in sent_at order, otherwise in the order received.
+    try:
+        events = parse_batch(decode_batch(request.get_data(), request.content_encoding))
+    except (ValueError, zlib.error) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-    return jsonify({"status": "success"}), 200
+    received_at = time.time()
+    results = [None] * len(events)
+    accepted = []
+    for index, data in enumerate(events):
+        if not isinstance(data, dict):
+            results[index] = {"status": "error", "message": "Invalid event"}
+        elif not data.get("plate"):
+            results[index] = {"status": "error", "message": "No plate provided"}
+        elif not isinstance(data["plate"], str):
+            results[index] = {"status": "error", "message": "Invalid plate"}
+        elif not isinstance(data.get("sent_at", 0), (int, float)):
+            results[index] = {"status": "error", "message": "Invalid sent_at"}
+        else:
+            # Built here so a bad field fails only its own event, before
+            # anything in the batch is applied
+            try:
+                entry = build_entry(data, received_at)
+            except ValueError as e:
+                results[index] = {"status": "error", "message": str(e)}
+                continue
+            accepted.append((data["plate"], data.get("sent_at", 0), index, data, entry))
+
+    # Stable sort, so events without sent_at keep their order within a plate
+    accepted.sort(key=lambda item: (item[0], item[1]))
+    by_plate = {}
+    for plate, _, _, data, entry in accepted:
+        by_plate.setdefault(plate, []).append((data, entry))
+
+    # One lock acquisition per plate for all of its events
+    for plate, entries in by_plate.items():
+        with plate_lock(plate):
+            for data, entry in entries:
+                apply_entry(plate, data.get("model", "Unknown"), entry)
+
+    for _, _, index, _, _ in accepted:
+        results[index] = {"status": "success"}
+    return jsonify({"status": "success", "results": results}), 200
+
+def latest_body(vehicle):
+    # Serialized latest state, re-encoded only after a version bump
+    cached = vehicle.get("latest_cache")
+    if cached is None or cached[0] != vehicle["version"]:
+        cached = vehicle["latest_cache"] = (vehicle["version"], dumps(vehicle["latest"]))
+    return cached
 
 @app.route('/data/<plate>', methods=['GET'])
 def get_latest_data(plate):
     if plate in fleet_data:
-        return jsonify(fleet_data[plate]["latest"])
+        vehicle = fleet_data[plate]
+        etag = f"{BOOT_ID}-{vehicle['version']}"
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            with plate_lock(plate):
+                version, body = latest_body(vehicle)
+            etag = f"{BOOT_ID}-{version}"
+            response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response
     return jsonify({"message": "No data available"}), 404
 
 @app.route('/history/<plate>', methods=['GET'])
 def get_history(plate):
+    # Optional filters: ?since=<epoch>&until=<epoch>&limit=<n>&cursor=<seq>
+    # The cursor to resume from is returned in the X-Next-Cursor header.
+    # ?view=snapshot returns the vehicle's full state after each entry
+    # instead of the raw entries.
+    if plate in fleet_data:
+        history = fleet_data[plate]["history"]
+        with plate_lock(plate):
+            first_seq, end_seq = history.window(
+                since=request.args.get("since", type=float),
+                until=request.args.get("until", type=float),
+                limit=request.args.get("limit", type=int),
+                cursor=request.args.get("cursor", type=int),
+            )
+        decode = history.snapshots if request.args.get("view") == "snapshot" else history.slice
+
+        # Encode and send a chunk at a time, so memory per request stays
+        # bounded however long the window is
+        def chunks():
+            separator = b"["
+            for seq in range(first_seq, end_seq, HISTORY_CHUNK):
+                with plate_lock(plate):
+                    entries = decode(seq, min(seq + HISTORY_CHUNK, end_seq))
+                if entries:
+                    yield separator + b",".join(dumps(entry) for entry in entries)
+                    separator = b","
+            yield b"[]" if separator == b"[" else b"]"
+
+        encoding = request.accept_encodings.best_match(["br", "gzip"] if brotli else ["gzip"])
+        response = Response(compressed(chunks(), encoding), mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.headers["X-Next-Cursor"] = str(end_seq)
+        return response
+    return jsonify({"message": "No history available"}), 404
+
+@app.route('/history/<plate>/bio', methods=['GET'])
+def get_bio_rollups(plate):
+    # ?metric=heart_rate&resolution=15m&since=<epoch>&until=<epoch>
+    metric = request.args.get("metric", "heart_rate")
+    resolution = request.args.get("resolution", "1m")
+    if metric not in BIO_METRICS or resolution not in RESOLUTIONS:
+        return jsonify({"status": "error", "message": "Unknown metric or resolution",
+                        "metrics": list(BIO_METRICS), "resolutions": list(RESOLUTIONS)}), 400
     if plate in fleet_data:
-        return jsonify(fleet_data[plate]["history"])
+        with plate_lock(plate):
+            points = fleet_data[plate]["rollups"].query(
+                metric, resolution,
+                since=request.args.get("since", type=float),
+                until=request.args.get("until", type=float),
+            )
+        return jsonify(points)
     return jsonify({"message": "No history available"}), 404
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/fleet/summary', methods=['GET'])
+def get_fleet_summary():
+    # Vehicle counts per current label plus alerts raised in the last 5/60 min;
+    # ?plates=true lists the plates behind each label instead of counting them
+    return jsonify(summary.summary(include_plates=request.args.get("plates") == "true"))
+
+@app.route('/stream/<plate>', methods=['GET'])
+def stream_latest(plate):
+    # Server-Sent Events: the full latest state first, then only changed fields
+    if not streams.enabled:
+        return jsonify({"message": "Streaming needs the gevent server"}), 503
+    if plate not in fleet_data:
+        return jsonify({"message": "No data available"}), 404
+    subscription = streams.subscribe(plate)
+
+    def events():
+        try:
+            yield f"data: {json.dumps(fleet_data[plate]['latest'])}\n\n"
+            while True:
+                changes = subscription.wait(STREAM_HEARTBEAT)
+                yield f"data: {json.dumps(changes)}\n\n" if changes else ": keep-alive\n\n"
+        finally:
+            streams.unsubscribe(plate, subscription)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/image/<digest>', methods=['GET'])
+def get_image(digest):
+    # Images never change for a given hash, so clients may cache them forever
+    if not images.exists(digest):
+        abort(404)
+    path = images.path(digest)
+    with open(path, "rb") as f:
+        mimetype = guess_mimetype(f.read(12))
+    response = send_file(path, mimetype=mimetype, etag=digest,
+                         conditional=True, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def run(mode, host, port, threads):
+    # gevent: one process, a greenlet per connection (best for many /stream clients)
+    # waitress: production WSGI server with a fixed pool of worker threads
+    # dev: Flask's built-in threaded server, for local debugging only
+    if mode == "gevent":
+        try:
+            from gevent.pywsgi import WSGIServer
+        except ImportError:
+            print("⚠️ gevent is not installed, falling back to the dev server")
+            mode = "dev"
+    if mode == "gevent":
+        server = WSGIServer((host, port), app, log=None)
+        server.init_socket()
+        # Headers and body go out in separate writes, avoid the Nagle delay
+        server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        streams.use_gevent()
+        server.serve_forever()
+    elif mode == "waitress":
+        # Every /stream would hold one of the worker threads for as long as
+        # the client stays connected, so streams are refused here; clients
+        # fall back to polling /data
+        from waitress import serve
+        streams.enabled = False
+        serve(app, host=host, port=port, threads=threads)
+    else:
+        app.run(host=host, port=port, threaded=True)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["gevent", "waitress", "dev"], default="gevent")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16, help="worker threads for waitress")
+    args = parser.parse_args()
+    run(args.mode, args.host, args.port, args.threads)
@@ -0,0 +1,28 @@
+import bisect
+import hashlib
+
+# Points each shard gets on the ring; more points spread plates more evenly
+RING_VNODES = 128
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class ShardRing:
+    """Consistent hashing of plates onto shards.
+
+    Every shard owns RING_VNODES points on a 64-bit circle and a plate
+    belongs to the first point at or after its hash, so adding or removing
+    a shard only moves about 1/N of the plates.
+    """
+
+    def __init__(self, shards, vnodes=RING_VNODES):
+        points = sorted((ring_hash(f"shard-{shard}#{index}"), shard)
+                        for shard in range(shards) for index in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def owner(self, plate):
+        index = bisect.bisect_left(self._hashes, ring_hash(plate))
+        return self._owners[index % len(self._owners)]
@@ -0,0 +1,370 @@
+# Plate-sharded deployment of server.py: N worker processes, each owning
+# the plates the consistent hash ring gives it, behind one front router.
+#
+# The router is a plain WSGI app on gevent that never parses more than it
+# needs: /trigger, /data/<plate>, /history/<plate> and /stream/<plate> are
+# relayed to the owning shard over pooled keep-alive connections,
+# /trigger/batch is split per shard, and fleet-wide endpoints
+# (/fleet/summary, /metrics, /image/<digest>) fan out and merge. Ingest
+# from the uplink names its plate in the X-Plate header, so /trigger and
+# its batches are relayed as they are, body unread; only requests without
+# it are parsed to find their plates.
+#
+# One router process is one core. --routers N starts N of them on the same
+# port with SO_REUSEPORT, and the kernel spreads connections across them.
+#
+# Each shard keeps its own database (fleet-shard<i>.db) and image folder
+# (images-shard<i>). Changing --shards moves about 1/N of the plates to
+# another shard; their earlier data stays behind on the old one.
+#
+# Usage: python shard_router.py --shards 4 --routers 2 --port 5000
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import zlib
+from urllib.parse import quote
+
+import gevent
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from blob_store import IMAGE_DIR
+from persistence import FLEET_DB
+from shard_ring import ShardRing
+from trigger_format import PLATE_HEADER, decode_batch, decode_plate, parse_batch
+from util import free_port, wait_until_up, HERE
+
+# Headers that only describe one hop and must not be relayed
+HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "te", "trailer", "transfer-encoding", "upgrade",
+               "host", "content-length"}
+
+# Routes whose second path segment is the plate
+PLATE_ROUTES = {"data", "history", "stream"}
+
+
+class Shard:
+    """One server.py process and a pool of keep-alive connections to it."""
+
+    def __init__(self, index, port, process=None):
+        self.index = index
+        self.port = port
+        self.process = process
+        self._idle = []
+
+    def request(self, method, target, body=None, headers=None):
+        # A pooled connection may have been closed by the shard meanwhile,
+        # so a failure on one is retried once on a fresh connection
+        while True:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            try:
+                conn.request(method, target, body, headers or {})
+                return conn, conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if not reused:
+                    raise
+
+    def release(self, conn, response):
+        if response.will_close:
+            conn.close()
+        else:
+            self._idle.append(conn)
+
+    def fetch(self, method, target, body=None, headers=None):
+        """Send a request and read the whole response: (status, headers, body)."""
+        conn, response = self.request(method, target, body, headers)
+        data = response.read()
+        self.release(conn, response)
+        return response.status, response.getheaders(), data
+
+
+def spawn_shards(count, mode):
+    shards = []
+    stem, extension = os.path.splitext(FLEET_DB)
+    for index in range(count):
+        port = free_port()
+        env = dict(os.environ, FLEET_DB=f"{stem}-shard{index}{extension or '.db'}",
+                   IMAGE_DIR=f"{IMAGE_DIR.rstrip(os.sep)}-shard{index}")
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "server.py"), "--mode", mode, "--host", "127.0.0.1",
+             "--port", str(port)], env=env)
+        shards.append(Shard(index, port, process))
+    for shard in shards:
+        wait_until_up(shard.port)
+    return shards
+
+
+# ---------- Merging fleet-wide responses ----------
+def merge_summary(total, part):
+    """Add one shard's /fleet/summary into total: counts add up, plate lists concatenate."""
+    for key, value in part.items():
+        if isinstance(value, dict):
+            merge_summary(total.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            total[key] = sorted(total.get(key, []) + value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def merge_metrics(texts):
+    """Concatenate each shard's Prometheus text, adding a shard label and
+    keeping every metric family's samples together under one HELP/TYPE."""
+    families = {}  # name -> [header lines, sample lines], in first-seen order
+    for index, text in enumerate(texts):
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, [[], []])
+                if len(family[0]) < 2 and line not in family[0]:
+                    family[0].append(line)
+            elif line and family is not None:
+                name, _, rest = line.partition("{")
+                if rest:
+                    family[1].append(f'{name}{{shard="{index}",{rest}')
+                else:
+                    name, _, value = line.partition(" ")
+                    family[1].append(f'{name}{{shard="{index}"}} {value}')
+    lines = []
+    for headers, samples in families.values():
+        lines.extend(headers)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Router ----------
+class Router:
+    def __init__(self, shards):
+        self.shards = shards
+        self.ring = ShardRing(len(shards))
+        self.pool = Pool(max(4, len(shards)))
+
+    def shard_for(self, plate):
+        return self.shards[self.ring.owner(plate)]
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        # PATH_INFO holds the raw URL bytes decoded as latin-1; plates in the
+        # path (e.g. Arabic ones) must hash the same as the JSON plate of
+        # /trigger, and the shard gets the request target exactly as sent
+        raw_path = environ.get("PATH_INFO", "").encode("latin-1")
+        path = raw_path.decode("utf-8", "replace")
+        query = environ.get("QUERY_STRING", "")
+        target = environ.get("RAW_URI") or environ.get("REQUEST_URI") or (
+            quote(raw_path) + ("?" + query if query else ""))
+        headers = {key[5:].replace("_", "-").title(): value
+                   for key, value in environ.items() if key.startswith("HTTP_")}
+        if environ.get("CONTENT_TYPE"):
+            headers["Content-Type"] = environ["CONTENT_TYPE"]
+        headers = {key: value for key, value in headers.items() if key.lower() not in HOP_HEADERS}
+        body = environ["wsgi.input"].read() if method in ("POST", "PUT", "PATCH") else None
+
+        parts = path.strip("/").split("/")
+        plate = decode_plate(headers.get(PLATE_HEADER))
+        if path in ("/trigger", "/trigger/batch") and method == "POST" and plate:
+            shard = self.shard_for(plate)
+        elif path == "/trigger" and method == "POST":
+            shard = self.shard_for(plate_of(body))
+        elif path == "/trigger/batch" and method == "POST":
+            return self.trigger_batch(body, headers, start_response)
+        elif path == "/fleet/summary":
+            return self.fleet_summary(target, start_response)
+        elif path == "/metrics":
+            return self.metrics(target, start_response)
+        elif parts[0] == "image" and len(parts) == 2:
+            return self.image(method, target, headers, start_response)
+        elif parts[0] in PLATE_ROUTES and len(parts) >= 2:
+            shard = self.shard_for(parts[1])
+        else:
+            shard = self.shards[0]
+        return self.relay(shard, method, target, body, headers, start_response)
+
+    def relay(self, shard, method, target, body, headers, start_response):
+        try:
+            conn, response = shard.request(method, target, body, headers)
+        except (OSError, http.client.HTTPException):
+            return respond(start_response, "502 Bad Gateway", b'{"message": "Shard unavailable"}')
+        start_response(f"{response.status} {response.reason}",
+                       [(key, value) for key, value in response.getheaders() if key.lower() not in HOP_HEADERS
+                        or (key.lower() == "content-length" and not response.chunked)])
+
+        if response.length is not None:
+            data = response.read()
+            shard.release(conn, response)
+            return [data]
+
+        # Chunked or open-ended (/history, /stream): pass pieces on as they come
+        def stream():
+            try:
+                while True:
+                    data = response.read1(65536)
+                    if not data:
+                        break
+                    yield data
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                return
+            finally:
+                if not response.isclosed():
+                    conn.close()
+            shard.release(conn, response)
+        return stream()
+
+    def trigger_batch(self, body, headers, start_response):
+        # A batch without X-Plate may mix plates: split it per shard
+        try:
+            events = parse_batch(decode_batch(body, headers.get("Content-Encoding")))
+        except (ValueError, zlib.error) as e:
+            return respond(start_response, "400 BAD REQUEST",
+                           json.dumps({"status": "error", "message": str(e)}).encode())
+
+        # Split by owner, remembering where each event came from
+        by_shard = {}
+        for index, data in enumerate(events):
+            plate = data.get("plate") if isinstance(data, dict) else None
+            shard = self.shard_for(plate) if isinstance(plate, str) and plate else self.shards[0]
+            indices, part = by_shard.setdefault(shard.index, ([], []))
+            indices.append(index)
+            part.append(data)
+
+        def send(item):
+            shard_index, (indices, part) = item
+            try:
+                status, _, data = self.shards[shard_index].fetch(
+                    "POST", "/trigger/batch", json.dumps(part).encode(), {"Content-Type": "application/json"})
+                if status == 200:
+                    return indices, json.loads(data)["results"]
+                message = f"Shard returned {status}"
+            except (OSError, http.client.HTTPException, ValueError, KeyError):
+                message = "Shard unavailable"
+            return indices, [{"status": "error", "message": message}] * len(indices)
+
+        results = [None] * len(events)
+        for indices, part_results in self.pool.imap_unordered(send, by_shard.items()):
+            for index, result in zip(indices, part_results):
+                results[index] = result
+        return respond(start_response, "200 OK", json.dumps({"status": "success", "results": results}).encode())
+
+    def fan_out(self, target):
+        def fetch(shard):
+            try:
+                return shard.fetch("GET", target)
+            except (OSError, http.client.HTTPException):
+                return 502, [], b""
+        return list(self.pool.imap(fetch, self.shards))
+
+    def fleet_summary(self, target, start_response):
+        total = {}
+        for status, _, data in self.fan_out(target):
+            if status == 200:
+                merge_summary(total, json.loads(data))
+        return respond(start_response, "200 OK", json.dumps(total).encode())
+
+    def metrics(self, target, start_response):
+        texts = [data.decode() for status, _, data in self.fan_out(target) if status == 200]
+        return respond(start_response, "200 OK", merge_metrics(texts).encode(),
+                       "text/plain; version=0.0.4; charset=utf-8")
+
+    def image(self, method, target, headers, start_response):
+        # Images live with the shard of the plate that sent them, and the
+        # digest doesn't say which plate that was, so ask each in turn
+        for shard in self.shards:
+            try:
+                status, response_headers, data = shard.fetch(method, target, None, headers)
+            except (OSError, http.client.HTTPException):
+                continue
+            if status != 404:
+                start_response(f"{status} {http.client.responses.get(status, '')}",
+                               [(key, value) for key, value in response_headers
+                                if key.lower() not in HOP_HEADERS or key.lower() == "content-length"])
+                return [data]
+        return respond(start_response, "404 NOT FOUND", b'{"message": "Image not found"}')
+
+
+def plate_of(body):
+    # The plate decides the shard; anything unparseable goes to shard 0,
+    # which answers with the usual error
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return ""
+    plate = data.get("plate") if isinstance(data, dict) else None
+    return plate if isinstance(plate, str) else ""
+
+
+def respond(start_response, status, body, content_type="application/json"):
+    start_response(status, [("Content-Type", content_type), ("Content-Length", str(len(body))),
+                            ("Access-Control-Allow-Origin", "*")])
+    return [body]
+
+
+def listen(host, port, reuse_port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    return sock
+
+
+def serve(listener, shards):
+    server = WSGIServer(listener, Router(shards), log=None)
+    gevent.signal_handler(signal.SIGTERM, server.stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--routers", type=int, default=max(1, (os.cpu_count() or 1) // 4),
+                        help="router processes sharing the port (SO_REUSEPORT)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--mode", choices=["gevent", "waitress"], default="gevent", help="server mode of each shard")
+    parser.add_argument("--shard-ports", help=argparse.SUPPRESS)  # set for the extra router processes
+    args = parser.parse_args()
+
+    if args.shard_ports:
+        shards = [Shard(index, int(port)) for index, port in enumerate(args.shard_ports.split(","))]
+        serve(listen(args.host, args.port, reuse_port=True), shards)
+        return
+
+    reuse_port = args.routers > 1 and hasattr(socket, "SO_REUSEPORT")
+    if args.routers > 1 and not reuse_port:
+        print("⚠️ SO_REUSEPORT is not available here, running a single router")
+    shards = spawn_shards(args.shards, args.mode)
+    routers = []
+    try:
+        listener = listen(args.host, args.port, reuse_port)
+        if reuse_port:
+            ports = ",".join(str(shard.port) for shard in shards)
+            routers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--host", args.host,
+                                         "--port", str(args.port), "--shard-ports", ports])
+                       for _ in range(args.routers - 1)]
+        print(f"🔀 Routing {args.host}:{args.port} with {1 + len(routers)} router(s) to {len(shards)} shards"
+              f" on ports {', '.join(str(shard.port) for shard in shards)}")
+        serve(listener, shards)
+    finally:
+        for process in routers + [shard.process for shard in shards]:
+            process.terminate()
+        for process in routers + [shard.process for shard in shards]:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
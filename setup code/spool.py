@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+
+# Disk budget for events waiting to be replayed
+SPOOL_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    priority INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS spool_priority ON spool (priority, id);
+"""
+
+
+class Spool:
+    """Durable FIFO of serialized events for when the server is unreachable.
+
+    Events survive a restart of the edge script and come back out in the
+    order they went in. When the spool grows past max_bytes, the oldest
+    events of the lowest priority present are evicted first.
+    """
+
+    def __init__(self, path, max_bytes=SPOOL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.count, self.bytes_held = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM spool").fetchone()
+        self.evicted = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, items):
+        """Append (priority, body) pairs in one transaction."""
+        rows = [(priority, len(body), body) for priority, body in items]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO spool (priority, size, body) VALUES (?, ?, ?)", rows)
+            self.count += len(rows)
+            self.bytes_held += sum(size for _, size, _ in rows)
+            while self.bytes_held > self.max_bytes and self.count > 0:
+                self._evict()
+
+    def _evict(self):
+        # Oldest first within the lowest priority, only as many as needed
+        victims, freed = [], 0
+        for row_id, size in self._conn.execute(
+                "SELECT id, size FROM spool WHERE priority = (SELECT MIN(priority) FROM spool) "
+                "ORDER BY id LIMIT 100"):
+            victims.append((row_id, size))
+            freed += size
+            if self.bytes_held - freed <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id, _ in victims])
+        self.count -= len(victims)
+        self.bytes_held -= sum(size for _, size in victims)
+        self.evicted += len(victims)
+
+    def peek(self, limit, max_bytes):
+        """Oldest events as (id, priority, body), at least one even if it is bigger than max_bytes."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, priority, size, body FROM spool ORDER BY id LIMIT ?",
+                                      (limit,)).fetchall()
+        batch, size = [], 0
+        for row_id, priority, row_size, body in rows:
+            if batch and size + row_size > max_bytes:
+                break
+            batch.append((row_id, priority, body))
+            size += row_size
+        return batch
+
+    def remove(self, ids):
+        placeholders = ",".join("?" * len(ids))
+        with self._lock, self._conn:
+            # Some may have been evicted meanwhile, only count what is still there
+            sizes = self._conn.execute(f"SELECT size FROM spool WHERE id IN ({placeholders})", ids).fetchall()
+            self._conn.execute(f"DELETE FROM spool WHERE id IN ({placeholders})", ids)
+            self.count -= len(sizes)
+            self.bytes_held -= sum(size for (size,) in sizes)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
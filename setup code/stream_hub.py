@@ -0,0 +1,68 @@
+import threading
+
+# Seconds between keep-alive comments on an idle stream
+STREAM_HEARTBEAT = 15
+
+
+class Subscription:
+    """One /stream client. Changes published while the client is busy are
+    merged into a single pending dict, so a slow client costs at most one
+    copy of the latest fields and always gets the newest values."""
+
+    def __init__(self, event):
+        self._event = event
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def push(self, changes):
+        with self._lock:
+            self._pending.update(changes)
+        self._event.set()
+
+    def wait(self, timeout):
+        """Return the changes since the last call, or {} after timeout."""
+        self._event.wait(timeout)
+        self._event.clear()
+        with self._lock:
+            changes, self._pending = self._pending, {}
+        return changes
+
+
+class StreamHub:
+    """Fan-out of latest-state changes to the subscribers of each plate."""
+
+    def __init__(self):
+        self._event_factory = threading.Event
+        self.enabled = True  # off under servers with a fixed thread pool
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def use_gevent(self):
+        # Under the gevent server every stream is a greenlet, so waiting has
+        # to yield to the event loop instead of blocking the OS thread.
+        from gevent.event import Event
+        self._event_factory = Event
+
+    def subscribe(self, plate):
+        subscription = Subscription(self._event_factory())
+        with self._lock:
+            self._subscribers.setdefault(plate, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, plate, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(plate)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    self._subscribers.pop(plate, None)
+
+    def publish(self, plate, changes):
+        # Copy under the lock: a concurrent (un)subscribe resizes the set
+        with self._lock:
+            subscribers = list(self._subscribers.get(plate, ()))
+        for subscription in subscribers:
+            subscription.push(changes)
+
+    def count(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
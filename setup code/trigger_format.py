@@ -0,0 +1,68 @@
+# Wire format of /trigger and /trigger/batch, shared by server.py, the
+# shard router and the uplink so they always agree on it.
+#
+# A batch body is a JSON array, or one JSON event per line (NDJSON),
+# optionally gzip-compressed. Senders that know every event in a request
+# belongs to one plate also name it in the X-Plate header (percent-encoded,
+# headers are ASCII), so a router can pick the shard without reading the
+# body.
+import json
+import re
+import zlib
+from urllib.parse import quote, unquote
+
+# Upper bound on a (decompressed) /trigger/batch body
+BATCH_MAX_BYTES = 16 * 1024 * 1024
+
+PLATE_HEADER = "X-Plate"
+
+# "plate": "<JSON string>" as json.dumps writes the top-level key
+PLATE_FIELD_RE = re.compile(r'"plate": ("(?:[^"\\]|\\.)*")')
+
+
+def decode_batch(body, content_encoding=None):
+    """Raw request body -> the batch as bytes; ValueError if it is too large."""
+    if content_encoding == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = inflater.decompress(body, BATCH_MAX_BYTES)
+        if inflater.unconsumed_tail:
+            raise ValueError("Batch too large")
+    elif len(body) > BATCH_MAX_BYTES:
+        raise ValueError("Batch too large")
+    return body
+
+
+def parse_batch(body):
+    # A JSON array, or one JSON event per line (NDJSON). A bad NDJSON line
+    # only fails that event, it is returned as None.
+    if body.lstrip().startswith(b"["):
+        return json.loads(body)
+    events = []
+    for line in body.splitlines():
+        if line.strip():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                events.append(None)
+    return events
+
+
+def common_plate(bodies):
+    """The plate every json.dumps'ed event in bodies has, or None if they
+    differ or one has none. Found by search, without decoding the bodies."""
+    match = PLATE_FIELD_RE.search(bodies[0]) if bodies else None
+    if not match:
+        return None
+    field = match.group(0)
+    if not all(field in body for body in bodies[1:]):
+        return None
+    plate = json.loads(match.group(1))
+    return plate or None
+
+
+def encode_plate(plate):
+    return quote(plate, safe="")
+
+
+def decode_plate(value):
+    return unquote(value) if value else ""
@@ -0,0 +1,374 @@
+# Shared telemetry uplink for the edge scripts (inner.py, outer.py, imu.py,
+# bio.py, exterior.py, Biomedical_main.py).
+#
+# send() only appends the event to a bounded in-memory queue and returns at
+# once, so sensor and inference loops never wait on the network. One
+# background worker drains the queue over a keep-alive requests.Session and
+# groups whatever is waiting into one /trigger/batch call. When the queue is
+# full the oldest event is dropped.
+#
+# With a spool_path, events that can't be delivered go to a disk spool
+# (spool.py) instead of being retried in memory: while the server is
+# unreachable everything is spooled and the worker probes it with
+# exponential backoff; once it answers again, live events go straight out
+# and the spool is replayed oldest first at no more than replay_rate
+# events per second.
+#
+# Critical alerts (PRIORITY_CRITICAL) skip all of that: they have their own
+# queue, worker and connection, go out without waiting for a batch to fill,
+# and are never stuck behind a large bulk upload. If they still can't be
+# delivered after a few quick retries they join the disk spool like
+# everything else, and alerts that only get through late are marked as
+# replayed so they don't pass for the vehicle's current state. Bulk events sent with a
+# coalesce_key replace a still-queued one with the same key, so a slow link
+# only ever carries the newest reading.
+import atexit
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from spool import Spool, SPOOL_MAX_BYTES
+from trigger_format import PLATE_HEADER, common_plate, encode_plate
+
+UPLINK_QUEUE_SIZE = 1000
+UPLINK_BATCH_SIZE = 50
+UPLINK_BATCH_BYTES = 512 * 1024
+UPLINK_TIMEOUT = (3, 10)  # (connect, read) seconds
+UPLINK_MAX_BACKOFF = 60
+UPLINK_REPLAY_RATE = 50  # spooled events per second once the server is back
+UPLINK_CRITICAL_MAX_BACKOFF = 5
+UPLINK_CRITICAL_ATTEMPTS = 3  # failed posts before alerts move to the spool
+UPLINK_CRITICAL_LATE = 30     # seconds after which an alert is no longer live
+UPLINK_CRITICAL_QUEUE = 100   # alerts held in memory when there is no spool
+
+# Under spool pressure the lowest priority is evicted first
+PRIORITY_LOW = 0     # periodic telemetry the next reading supersedes (speed, IMU)
+PRIORITY_NORMAL = 1  # detections and bio readings
+PRIORITY_CRITICAL = 2  # safety alerts (driver asleep, collision warning)
+
+
+class ServerBusy(Exception):
+    """5xx or 429: the event is fine, the server just couldn't take it now."""
+
+
+class Uplink:
+    def __init__(self, server_ip, port=5000, queue_size=UPLINK_QUEUE_SIZE, batch_size=UPLINK_BATCH_SIZE,
+                 batch_wait=0.2, timeout=UPLINK_TIMEOUT, max_backoff=UPLINK_MAX_BACKOFF,
+                 spool_path=None, spool_max_bytes=SPOOL_MAX_BYTES, replay_rate=UPLINK_REPLAY_RATE):
+        self.url = f"http://{server_ip}:{port}"
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.replay_rate = replay_rate
+        self.spool = Spool(spool_path, spool_max_bytes) if spool_path else None
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.critical_session = requests.Session()
+        self.critical_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+        self._queue = deque()  # [priority, event, coalesce_key]
+        self._coalesce = {}    # coalesce_key -> its entry still in _queue
+        self._queue_size = queue_size
+        self._cond = threading.Condition()
+        self._closing = False
+        self._stop = threading.Event()  # cuts a backoff wait short on close()
+        self.sent = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self._critical = []
+        self._critical_cond = threading.Condition()
+
+        # Spool mode: offline until retry_at, replay paced by next_replay
+        self._offline = False
+        self._delay = 1.0
+        self._retry_at = 0.0
+        self._next_replay = 0.0
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+        self._critical_worker = threading.Thread(target=self._run_critical, daemon=True)
+        self._critical_worker.start()
+        atexit.register(self.close)
+
+    # ---------- Producer side ----------
+    def send(self, event, priority=PRIORITY_NORMAL, coalesce_key=None):
+        """Queue one /trigger payload; never blocks."""
+        event = dict(event, sent_at=time.time())
+        if priority >= PRIORITY_CRITICAL:
+            with self._critical_cond:
+                self._critical.append(event)
+                self._critical_cond.notify()
+            return
+
+        with self._cond:
+            if coalesce_key is not None and coalesce_key in self._coalesce:
+                self._coalesce[coalesce_key][1] = event
+                self.coalesced += 1
+                return
+            if len(self._queue) >= self._queue_size:
+                self._forget(self._queue.popleft())
+                self.dropped += 1
+            entry = [priority, event, coalesce_key]
+            self._queue.append(entry)
+            if coalesce_key is not None:
+                self._coalesce[coalesce_key] = entry
+            self._cond.notify()
+
+    def _forget(self, entry):
+        if entry[2] is not None:
+            del self._coalesce[entry[2]]
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def close(self, timeout=5.0):
+        """Try to deliver what is still queued for up to timeout seconds;
+        with a spool, whatever can't be delivered stays spooled on disk."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        with self._critical_cond:
+            self._critical_cond.notify()
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        self._critical_worker.join(timeout)
+        self._worker.join(max(0.0, deadline - time.monotonic()))
+
+    # ---------- Worker ----------
+    def _take(self, timeout=None):
+        # Wait up to timeout (None: forever) for an event, then give others
+        # batch_wait seconds to join it. Returns [] on timeout and None once
+        # closing with nothing left.
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._queue and not self._closing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+            if not self._queue:
+                return None
+            deadline = time.monotonic() + self.batch_wait
+            while len(self._queue) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size = [], 0
+            while self._queue and len(batch) < self.batch_size:
+                priority, event, _ = self._queue[0]
+                body = json.dumps(event)
+                if batch and size + len(body) > UPLINK_BATCH_BYTES:
+                    break
+                self._forget(self._queue.popleft())
+                batch.append((priority, body))
+                size += len(body)
+            return batch
+
+    def _run(self):
+        while True:
+            if self.spool is None:
+                batch = self._take()
+                if batch is None:
+                    return
+                self._deliver([body for _, body in batch])
+                continue
+
+            timeout = None
+            if len(self.spool) and not self._closing:
+                timeout = max(0.0, (self._retry_at if self._offline else self._next_replay) - time.monotonic())
+            batch = self._take(timeout)
+            if batch is None:
+                return
+            if batch and (self._offline or not self._try([body for _, body in batch])):
+                self._spool(batch)
+            if not self._closing:
+                self._replay()
+
+    def _deliver(self, batch):
+        delay = 1.0
+        failing = False
+        while True:
+            try:
+                self._post(batch, self.session)
+                if failing:
+                    print(f"✅ Uplink to {self.url} restored")
+                return
+            except (requests.RequestException, ServerBusy) as e:
+                if self._closing:
+                    self.dropped += len(batch)
+                    return
+                if not failing:
+                    print(f"❌ Uplink to {self.url} failed ({e}), retrying with backoff")
+                failing = True
+                # Jitter so vehicles coming back online don't retry in lockstep
+                self._stop.wait(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self.max_backoff)
+
+    # ---------- Spool mode ----------
+    def _try(self, bodies):
+        # One attempt; a failure switches to offline and schedules the next probe
+        try:
+            self._post(bodies, self.session)
+        except (requests.RequestException, ServerBusy) as e:
+            if not self._offline:
+                print(f"❌ Uplink to {self.url} failed ({e}), spooling to {self.spool.path}")
+            self._offline = True
+            # Jitter so vehicles coming back online don't retry in lockstep
+            self._retry_at = time.monotonic() + self._delay * random.uniform(0.5, 1.0)
+            self._delay = min(self._delay * 2, self.max_backoff)
+            return False
+        if self._offline:
+            print(f"✅ Uplink to {self.url} restored, replaying {len(self.spool)} spooled events")
+        self._offline = False
+        self._delay = 1.0
+        return True
+
+    def _spool(self, batch):
+        # Marked as replayed so the server files them in history without
+        # letting them overwrite a newer latest state
+        self.spool.push((priority, body[:-1] + ', "replayed": true}') for priority, body in batch)
+
+    def _replay(self):
+        now = time.monotonic()
+        if not len(self.spool) or now < (self._retry_at if self._offline else self._next_replay):
+            return
+        rows = self.spool.peek(self.batch_size, UPLINK_BATCH_BYTES)
+        if not rows:
+            return
+        # While offline the oldest spooled batch doubles as the probe
+        if self._try([body for _, _, body in rows]):
+            self.spool.remove([row_id for row_id, _, _ in rows])
+            self.replayed += len(rows)
+            self._next_replay = now + len(rows) / self.replay_rate
+
+    # ---------- Critical lane ----------
+    def _run_critical(self):
+        # Alerts go out as soon as they arrive, at most one batch per request.
+        # Ones that failed stay at the front and are retried with a short
+        # backoff together with new ones, until UPLINK_CRITICAL_ATTEMPTS
+        # failures in a row park them on the spool
+        pending = deque()
+        failures = 0
+        delay = 0.25
+        while True:
+            with self._critical_cond:
+                if not pending:
+                    while not self._critical and not self._closing:
+                        self._critical_cond.wait()
+                pending.extend(self._critical)
+                self._critical.clear()
+            if not pending:
+                return
+            bodies = self._critical_batch(pending)
+            try:
+                self._post(bodies, self.critical_session)
+                for _ in bodies:
+                    pending.popleft()
+                failures = 0
+                delay = 0.25
+                continue
+            except (requests.RequestException, ServerBusy) as e:
+                failures += 1
+                if self._closing or failures >= UPLINK_CRITICAL_ATTEMPTS:
+                    self._park(pending)
+                    if self._closing:
+                        return
+                if failures == 1:
+                    print(f"❌ Critical alert to {self.url} failed ({e}), retrying")
+            with self._critical_cond:
+                self._critical_cond.wait(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, UPLINK_CRITICAL_MAX_BACKOFF)
+
+    def _critical_batch(self, pending):
+        # Oldest alerts first, within the same count and size limits as bulk
+        # batches; ones no longer live are flagged so the server only files them
+        bodies, size = [], 0
+        now = time.time()
+        for event in pending:
+            if len(bodies) >= self.batch_size:
+                break
+            if now - event["sent_at"] > UPLINK_CRITICAL_LATE:
+                event = dict(event, replayed=True)
+            body = json.dumps(event)
+            if bodies and size + len(body) > UPLINK_BATCH_BYTES:
+                break
+            bodies.append(body)
+            size += len(body)
+        return bodies
+
+    def _park(self, pending):
+        # Spooled alerts survive a crash and are replayed (marked replayed)
+        # after the outage; without a spool only the newest few are kept
+        if self.spool is not None:
+            self._spool([(PRIORITY_CRITICAL, json.dumps(event)) for event in pending])
+            pending.clear()
+            # Wake the bulk worker, it replays the spool once the server is back
+            with self._cond:
+                self._cond.notify()
+        elif self._closing:
+            self.dropped += len(pending)
+            pending.clear()
+        else:
+            while len(pending) > UPLINK_CRITICAL_QUEUE:
+                pending.popleft()
+                self.dropped += 1
+
+    def _post(self, batch, session):
+        headers = {"Content-Type": "application/json"}
+        # Lets a shard router route the request without parsing it
+        plate = common_plate(batch)
+        if plate:
+            headers[PLATE_HEADER] = encode_plate(plate)
+        if len(batch) == 1:
+            response = session.post(f"{self.url}/trigger", data=batch[0], headers=headers, timeout=self.timeout)
+        else:
+            response = session.post(f"{self.url}/trigger/batch", data="[" + ",".join(batch) + "]",
+                                    headers=headers, timeout=self.timeout)
+        if response.status_code >= 500 or response.status_code == 429:
+            raise ServerBusy(f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            # Retrying a rejected event can't help
+            self.rejected += len(batch)
+            print(f"⚠️ Server rejected {len(batch)} event(s): {response.status_code} {response.text[:200]}")
+            return
+
+        rejected = 0
+        if len(batch) > 1:
+            try:
+                results = response.json().get("results", [])
+            except ValueError:
+                results = []
+            rejected = sum(result.get("status") != "success" for result in results)
+            self.rejected += rejected
+        self.sent += len(batch) - rejected
+
+
+class Cooldowns:
+    """Minimum seconds between two sends of the same class (e.g. a label),
+    so a rare critical detection isn't held back by a global interval."""
+
+    def __init__(self, intervals, default):
+        self.intervals = intervals
+        self.default = default
+        self._last = {}
+
+    def ready(self, key, now=None):
+        """True (and the cooldown restarts) if key may be sent now."""
+        now = time.monotonic() if now is None else now
+        last = self._last.get(key)
+        if last is not None and now - last < self.intervals.get(key, self.default):
+            return False
+        self._last[key] = now
+        return True